@@ -29,6 +29,8 @@ setup(
         "sqlalchemy-utils",
         "dnspython",
         "pymssql",
+        "duckdb",
+        "duckdb-engine",
         "tox",
         "tox-gh-actions",
     ],
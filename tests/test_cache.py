@@ -0,0 +1,136 @@
+"""Test query result cache"""
+
+import time
+
+import pandas as pd
+import pytest
+from write_df.backends import get_backend
+from write_df.cache import QueryCache, normalize_query
+from write_df.sql_writer import SQLDatabaseWriter
+
+
+def test_normalize_query():
+    """Test that whitespace outside literals and trailing semicolons do not change the key."""
+
+    assert normalize_query("SELECT *\n  FROM  t ;") == "SELECT * FROM t"
+    assert normalize_query("select 'A  b'") == "select 'A  b'"
+    assert normalize_query("select 'A  b'") != normalize_query("select 'A b'")
+    assert normalize_query("select  'it''s  ;'  ;") == "select 'it''s  ;'"
+
+
+def test_get_returns_copy():
+    """Test that mutating a returned result leaves the cached one intact."""
+
+    cache = QueryCache(max_bytes=10**6)
+    cache.set("SELECT * FROM t", pd.DataFrame({"a": [1, 2]}))
+
+    res = cache.get("select * from t")
+    assert res is None
+
+    res = cache.get("SELECT *  FROM t;")
+    res["a"] = 0
+    assert cache.get("SELECT * FROM t")["a"].tolist() == [1, 2]
+
+
+def test_evicts_least_recently_used():
+    """Test that the byte bound evicts the least recently used entries."""
+
+    data = pd.DataFrame({"a": range(100)})
+    size = int(data.memory_usage(deep=True).sum())
+    cache = QueryCache(max_bytes=2 * size)
+
+    cache.set("SELECT a FROM t1", data)
+    cache.set("SELECT a FROM t2", data)
+    cache.get("SELECT a FROM t1")
+    cache.set("SELECT a FROM t3", data)
+
+    assert len(cache) == 2
+    assert cache.size <= cache.max_bytes
+    assert cache.get("SELECT a FROM t2") is None
+    assert cache.get("SELECT a FROM t1") is not None
+
+    cache.set("SELECT a FROM t4", pd.DataFrame({"a": range(1000)}))
+    assert cache.get("SELECT a FROM t4") is None
+
+
+def test_ttl_expires_entries():
+    """Test that entries expire after the TTL."""
+
+    cache = QueryCache(max_bytes=10**6, ttl=0.01)
+    cache.set("SELECT a FROM t", [1, 2])
+    assert cache.get("SELECT a FROM t") == [1, 2]
+
+    time.sleep(0.02)
+    assert cache.get("SELECT a FROM t") is None
+    assert len(cache) == 0
+
+
+def test_invalidate_by_table():
+    """Test that invalidating a table drops only queries mentioning it."""
+
+    cache = QueryCache(max_bytes=10**6)
+    cache.set("SELECT a FROM t1 JOIN t2 ON t1.a = t2.a", [1])
+    cache.set("SELECT a FROM t3", [2])
+    cache.set("list_collections", ["t3"], tables=["*"])
+
+    cache.invalidate("T2")
+
+    assert cache.get("SELECT a FROM t1 JOIN t2 ON t1.a = t2.a") is None
+    assert cache.get("SELECT a FROM t3") == [2]
+    assert cache.get("list_collections") is None
+
+
+def test_writer_invalidates_on_write():
+    """Test that the SQL writer serves cached reads until it writes the table."""
+
+    writer = SQLDatabaseWriter(dbtype="sqlite", dbname=":memory:", cache_size=10**6)
+    table_name = "test__table__"
+    query = f"SELECT COUNT(*) AS n FROM {table_name}"
+    data = pd.DataFrame({"a": [1, 2, 3]})
+
+    writer.write_df_to_db(data=data, table_name=table_name, id_col=None)
+    assert writer.get_data_from_query(query=query)["n"][0] == 3
+
+    writer.write_df_to_db(data=data, table_name=table_name, id_col=None)
+    assert writer.get_data_from_query(query=query)["n"][0] == 6
+
+    writer.delete_table(table_name=table_name)
+    writer.write_df_to_db(data=data, table_name=table_name, id_col=None)
+    assert writer.get_data_from_query(query=query)["n"][0] == 3
+    writer.close_connection()
+
+
+def test_writer_invalidates_on_failed_write(monkeypatch):
+    """Test that a write failing after the table was created drops cached reads."""
+
+    writer = SQLDatabaseWriter(dbtype="sqlite", dbname=":memory:", cache_size=10**6)
+    table_name = "test__table__"
+    query = f"SELECT name FROM sqlite_master WHERE name = '{table_name}'"
+    data = pd.DataFrame({"a": [1, 2, 3]})
+
+    assert writer.get_data_from_query(query=query).shape[0] == 0
+
+    def _fail(**kwargs):
+
+        raise RuntimeError("load failed")
+
+    monkeypatch.setattr(get_backend("sqlite"), "bulk_load", _fail)
+    with pytest.raises(RuntimeError):
+        writer.write_df_to_db(data=data, table_name=table_name, id_col=None)
+
+    assert writer.get_data_from_query(query=query).shape[0] == 1
+    writer.close_connection()
+
+
+def test_writer_keeps_literal_whitespace():
+    """Test that queries differing only inside a literal are cached apart."""
+
+    writer = SQLDatabaseWriter(dbtype="sqlite", dbname=":memory:", cache_size=10**6)
+    table_name = "test__table__"
+    data = pd.DataFrame({"v": [1, 2], "name": ["a b", "a  b"]})
+    writer.write_df_to_db(data=data, table_name=table_name, id_col=None)
+
+    query = f"select v from {table_name} where name = "
+    assert writer.get_data_from_query(query=query + "'a b'")["v"].tolist() == [1]
+    assert writer.get_data_from_query(query=query + "'a  b'")["v"].tolist() == [2]
+    writer.close_connection()
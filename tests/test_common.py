@@ -0,0 +1,185 @@
+"""Test dataframe conversion helpers"""
+
+from datetime import timezone
+
+import bson
+import numpy as np
+import pandas as pd
+import pymongo
+import write_df.nosql_writer
+from write_df.common import (
+    SharedFrame,
+    get_batch_size,
+    get_process_pool,
+    to_records,
+)
+from write_df.nosql_writer import (
+    NoSQLDatabaseWriter,
+    _get_document_id,
+    encode_documents,
+)
+
+
+class FakeCollection:
+    """Collection recording inserted documents"""
+
+    def __init__(self) -> None:
+        self.batches = []
+
+    def insert_many(self, documents):
+
+        from pymongo.results import InsertManyResult
+
+        self.batches.append(list(documents))
+
+        return InsertManyResult(inserted_ids=[], acknowledged=True)
+
+
+class FakeMongoClient:
+    """Client handing out one fake collection"""
+
+    collection = FakeCollection()
+
+    def __init__(self, **kwargs) -> None:
+        pass
+
+    def __getitem__(self, name: str):
+
+        return {"_test_collection_": self.collection}
+
+
+def _get_data(size: int = 50):
+
+    return pd.DataFrame(
+        {
+            "name": [f"name_{i}" if i % 7 else None for i in range(size)],
+            "value": np.linspace(0, 1, size),
+            "big": np.arange(size, dtype="int64") * 10**12,
+            "count": pd.array([i if i % 3 else None for i in range(size)], "Int64"),
+            "flag": np.arange(size) % 2 == 0,
+            "ts": pd.date_range("2020-01-01", periods=size, freq="H", tz="US/Eastern"),
+        }
+    )
+
+
+def _keep_records(records):
+
+    return records
+
+
+def test_shared_frame_matches_serial():
+    """Test that records built in the process pool equal serial conversion."""
+
+    data = _get_data()
+    data.loc[5, "ts"] = pd.NaT
+
+    with SharedFrame(data=data) as shared:
+        records = shared.map(
+            encode=_keep_records, start=0, stop=data.shape[0], processes=2
+        )
+        batch = shared.map(encode=_keep_records, start=10, stop=23, processes=2)
+
+    assert records == to_records(data=data)
+    assert batch == to_records(data=data.iloc[10:23])
+
+
+def test_encode_documents_in_pool():
+    """Test that BSON built in the process pool decodes to the serial records."""
+
+    data = _get_data().drop(columns="ts")
+
+    with SharedFrame(data=data) as shared:
+        encoded = shared.map(
+            encode=encode_documents, start=0, stop=data.shape[0], processes=2
+        )
+
+    ids = [_get_document_id(raw) for raw in encoded]
+    documents = [bson.decode(raw) for raw in encoded]
+    assert len(set(ids)) == data.shape[0]
+    assert [document.pop("_id") for document in documents] == ids
+    assert documents == to_records(data=data)
+
+
+def test_encode_documents_keeps_given_id():
+    """Test that an `_id` column is kept and read back from the BSON."""
+
+    encoded = encode_documents([{"_id": 7, "a": 1.5}])
+
+    assert _get_document_id(encoded[0]) == 7
+    assert bson.decode(encoded[0]) == {"_id": 7, "a": 1.5}
+
+
+def test_encode_documents_datetimes_in_utc():
+    """Test that time zone aware values are encoded as the same instant."""
+
+    data = _get_data(size=3)[["ts"]]
+
+    with SharedFrame(data=data) as shared:
+        encoded = shared.map(encode=encode_documents, start=0, stop=3, processes=2)
+
+    options = bson.CodecOptions(tz_aware=True, tzinfo=timezone.utc)
+    values = [bson.decode(raw, codec_options=options)["ts"] for raw in encoded]
+    assert values == data["ts"].tolist()
+
+
+def test_process_pool_reused():
+    """Test that the process pool is created once per worker count."""
+
+    assert get_process_pool(processes=2) is get_process_pool(processes=2)
+
+
+def test_process_pool_does_not_fork():
+    """Test that pool workers are not forked from a possibly threaded parent."""
+
+    pool = get_process_pool(processes=2)
+
+    assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+
+
+def test_batch_size_samples_whole_frame():
+    """Test that long rows at the end of the frame shrink the batches."""
+
+    short = pd.DataFrame({"text": ["a"] * 4000})
+    mixed = pd.DataFrame({"text": ["a"] * 2000 + ["a" * 1000] * 2000})
+
+    assert (
+        get_batch_size(data=mixed, memory_limit=10**6)
+        < get_batch_size(data=short, memory_limit=10**6) / 2
+    )
+
+
+def test_mongo_batches_share_one_shared_frame(monkeypatch):
+    """Test that batched writes with processes share columns once per write."""
+
+    frames = []
+
+    class CountingSharedFrame(SharedFrame):
+        """Shared frame counting its instances"""
+
+        def __init__(self, data) -> None:
+            super().__init__(data=data)
+            frames.append(self)
+
+    monkeypatch.setattr(pymongo, "MongoClient", FakeMongoClient)
+    monkeypatch.setattr(write_df.nosql_writer, "SharedFrame", CountingSharedFrame)
+    FakeMongoClient.collection.batches.clear()
+
+    writer = NoSQLDatabaseWriter(
+        dbtype="mongo", host="host", dbname="db", user="u", password="", port=0
+    )
+    data = _get_data(size=200)
+    res = writer.write_data_to_collection(
+        collection_name="_test_collection_",
+        data=data,
+        processes=2,
+        memory_limit=8 * 1024,
+    )
+
+    batches = FakeMongoClient.collection.batches
+    assert len(frames) == 1
+    assert len(batches) > 1
+    assert sum(len(batch) for batch in batches) == data.shape[0]
+    assert len(set(res.inserted_ids)) == data.shape[0]
+    assert [document["name"] for batch in batches for document in batch] == data[
+        "name"
+    ].tolist()
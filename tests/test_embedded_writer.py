@@ -0,0 +1,274 @@
+"""Test writing dataframes to embedded databases"""
+
+import random
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from write_df.sql_writer import SQLDatabaseWriter
+
+DBNAME = ":memory:"
+
+SQLITE_CONNECTION = SQLDatabaseWriter(dbtype="sqlite", dbname=DBNAME)
+DUCKDB_CONNECTION = SQLDatabaseWriter(dbtype="duckdb", dbname=DBNAME)
+
+CONNECTIONS = [
+    ("sqlite", {"conn": SQLITE_CONNECTION}),
+    ("duckdb", {"conn": DUCKDB_CONNECTION}),
+]
+
+SCHEMA_CONNECTIONS = [
+    (
+        "sqlite",
+        {
+            "conn": SQLITE_CONNECTION,
+            "schema_query": "SELECT name, type FROM pragma_table_info('{}')",
+            "types": {
+                "big": "BIGINT",
+                "unsigned": "BIGINT",
+                "count": "BIGINT",
+                "flag": "BOOLEAN",
+                "name": "VARCHAR(100)",
+                "ts": "DATETIME",
+                "price": "NUMERIC(38, 10)",
+                "u": "BIGINT",
+            },
+        },
+    ),
+    (
+        "duckdb",
+        {
+            "conn": DUCKDB_CONNECTION,
+            "schema_query": "SELECT column_name AS name, data_type AS type FROM information_schema.columns WHERE table_name = '{}'",
+            "types": {
+                "big": "BIGINT",
+                "unsigned": "BIGINT",
+                "count": "BIGINT",
+                "flag": "BOOLEAN",
+                "name": "VARCHAR",
+                "ts": "TIMESTAMP WITH TIME ZONE",
+                "price": "DECIMAL(38,10)",
+                "u": "DECIMAL(20,0)",
+            },
+        },
+    ),
+]
+
+
+def pytest_generate_tests(metafunc):
+    """Generate pytest Tests for all connections
+
+    :param metafunc: _description_
+    :type metafunc: _type_
+    """
+
+    idlist = []
+    argvalues = []
+    for scenario in metafunc.cls.connections:
+        idlist.append(scenario[0])
+        items = scenario[1].items()
+        argnames = [x[0] for x in items]
+        argvalues.append([x[1] for x in items])
+    metafunc.parametrize(argnames, argvalues, ids=idlist, scope="class")
+
+
+def _get_data(size: int = 100):
+
+    return pd.DataFrame(
+        {
+            "city": [f"city_{i}" for i in range(size)],
+            "population": [random.randint(1, 10**6) for i in range(size)],
+            "y": [random.random() for i in range(size)],
+        }
+    )
+
+
+def _get_row_count(conn: SQLDatabaseWriter, table_name: str):
+
+    res = conn.get_data_from_query(query=f"SELECT COUNT(*) AS n FROM {table_name}")
+
+    return int(res["n"][0])
+
+
+class TestWriteToEmbedded:
+    """Test class for writing to embedded databases"""
+
+    connections = CONNECTIONS
+
+    def test_get_list_of_database(self, conn: SQLDatabaseWriter):
+        """Test listing the databases of the embedded connection"""
+
+        database_names = set(conn.get_list_of_database())
+        assert database_names & {"main", "memory"}
+
+    def test_write_without_primary_key_no_null(self, conn: SQLDatabaseWriter):
+        """Test writing dataframe without primary key"""
+
+        data = _get_data()
+        table_name = "test__table__"
+
+        conn.write_df_to_db(
+            data=data,
+            table_name=table_name,
+            id_col=None,
+            drop_first=True,
+        )
+        assert conn.has_table(table_name=table_name) is True
+        assert _get_row_count(conn=conn, table_name=table_name) == data.shape[0]
+        conn.delete_table(table_name=table_name)
+        assert conn.has_table(table_name=table_name) is False
+
+    def test_write_with_primary_key_null(self, conn: SQLDatabaseWriter):
+        """Test writing dataframe with generated primary key and null values"""
+
+        data = _get_data()
+        data.at[0, "y"] = np.nan
+        table_name = "test__table__"
+
+        conn.write_df_to_db(data=data, table_name=table_name, drop_first=True)
+        conn.write_df_to_db(data=data, table_name=table_name)
+
+        res = conn.get_data_from_query(query=f"SELECT id FROM {table_name}")
+        assert res["id"].is_unique
+        assert res.shape[0] == 2 * data.shape[0]
+        conn.delete_table(table_name=table_name)
+
+    def test_drop_first_restarts_ids(self, conn: SQLDatabaseWriter):
+        """Test that dropping the table also resets its generated ids"""
+
+        data = _get_data(size=3)
+        table_name = "test__table__"
+
+        for _ in range(2):
+            conn.write_df_to_db(data=data, table_name=table_name, drop_first=True)
+
+        res = conn.get_data_from_query(query=f"SELECT id FROM {table_name}")
+        assert sorted(res["id"].tolist()) == [1, 2, 3]
+        conn.delete_table(table_name=table_name)
+
+    def test_write_with_memory_limit(self, conn: SQLDatabaseWriter):
+        """Test writing dataframe in batches bounded by a memory limit"""
+
+        data = _get_data(size=1000)
+        table_name = "test__table__"
+
+        results = conn.write_df_to_db(
+            data=data,
+            table_name=table_name,
+            id_col=None,
+            drop_first=True,
+            memory_limit=32 * 1024,
+        )
+        assert isinstance(results, list)
+        assert len(results) > 1
+        assert _get_row_count(conn=conn, table_name=table_name) == data.shape[0]
+        conn.delete_table(table_name=table_name)
+
+
+class TestColumnTypes:
+    """Test class for column types and values of embedded databases"""
+
+    connections = SCHEMA_CONNECTIONS
+
+    def test_write_extension_dtypes(
+        self, conn: SQLDatabaseWriter, schema_query: str, types: dict
+    ):
+        """Test writing nullable, unsigned, datetime and decimal columns"""
+
+        data = pd.DataFrame(
+            {
+                "big": [1, 2, 3 * 10**12],
+                "unsigned": np.array([1, 2, 4_000_000_000], dtype="uint32"),
+                "count": pd.array([1, None, 3], dtype="Int64"),
+                "flag": pd.array([True, None, False], dtype="boolean"),
+                "name": pd.array(["a", None, "c"], dtype="string"),
+                "ts": pd.to_datetime(
+                    ["2020-01-01 05:00", None, "2020-01-03 00:00"]
+                ).tz_localize("US/Eastern"),
+                "price": [Decimal("1.10"), None, Decimal("3")],
+            }
+        )
+        table_name = "test__table__"
+
+        conn.write_df_to_db(
+            data=data, table_name=table_name, id_col=None, drop_first=True
+        )
+
+        schema = conn.get_data_from_query(query=schema_query.format(table_name))
+        assert dict(zip(schema["name"], schema["type"])) == {
+            column: types[column] for column in data.columns
+        }
+
+        res = conn.get_data_from_query(query=f"SELECT * FROM {table_name}")
+        assert res["big"].tolist() == [1, 2, 3 * 10**12]
+        assert res["unsigned"].tolist() == [1, 2, 4_000_000_000]
+        assert res["count"].astype("Int64").tolist() == [1, pd.NA, 3]
+        assert res["flag"].astype("boolean").tolist() == [True, pd.NA, False]
+        assert res["name"].tolist() == ["a", None, "c"]
+        pd.testing.assert_series_equal(
+            pd.to_datetime(res["ts"], utc=True),
+            data["ts"].dt.tz_convert("UTC"),
+        )
+        assert res["price"].astype(float).tolist()[::2] == [1.1, 3.0]
+        assert res["price"].isna().tolist() == [False, True, False]
+        conn.delete_table(table_name=table_name)
+
+    def test_write_uint64(
+        self, conn: SQLDatabaseWriter, schema_query: str, types: dict
+    ):
+        """Test that unsigned 64 bit values get a type wide enough for them"""
+
+        data = pd.DataFrame({"u": np.array([0, 2**63 - 1], dtype="uint64")})
+        table_name = "test__table__"
+
+        conn.write_df_to_db(
+            data=data, table_name=table_name, id_col=None, drop_first=True
+        )
+
+        schema = conn.get_data_from_query(query=schema_query.format(table_name))
+        assert schema["type"].tolist() == [types["u"]]
+        res = conn.get_data_from_query(
+            query=f"SELECT CAST(u AS VARCHAR) AS u FROM {table_name}"
+        )
+        assert res["u"].tolist() == ["0", str(2**63 - 1)]
+        conn.delete_table(table_name=table_name)
+
+
+class TestDuckDBSchemas:
+    """Test class for DuckDB tables and sequences across schemas"""
+
+    connections = [("duckdb", {"conn": DUCKDB_CONNECTION})]
+
+    def test_delete_table_drops_sequence(self, conn: SQLDatabaseWriter):
+        """Test that deleting a table leaves no id sequence behind"""
+
+        table_name = "test__table__"
+        query = "SELECT sequence_name FROM duckdb_sequences()"
+
+        conn.write_df_to_db(data=_get_data(size=3), table_name=table_name)
+        assert f"{table_name}_id_seq" in conn.get_data_from_query(query=query).values
+        conn.delete_table(table_name=table_name)
+
+        assert conn.get_data_from_query(query=query).shape[0] == 0
+
+    def test_same_table_name_in_other_schema(self, conn: SQLDatabaseWriter, tmp_path):
+        """Test that a table of the same name in another schema is ignored"""
+
+        import duckdb
+
+        dbname = str(tmp_path / "schemas.duckdb")
+        table_name = "test__table__"
+        connection = duckdb.connect(dbname)
+        connection.execute("CREATE SCHEMA other")
+        connection.execute(f"CREATE TABLE other.{table_name} (a INTEGER)")
+        connection.close()
+
+        writer = SQLDatabaseWriter(dbtype="duckdb", dbname=dbname)
+        data = _get_data(size=3)
+        assert writer.has_table(table_name=table_name) is False
+
+        writer.write_df_to_db(data=data, table_name=table_name, id_col=None)
+
+        assert writer.has_table(table_name=table_name) is True
+        assert _get_row_count(conn=writer, table_name=table_name) == data.shape[0]
+        writer.close_connection()
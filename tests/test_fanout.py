@@ -0,0 +1,126 @@
+"""Test FanOutWriter Class"""
+
+import numpy as np
+import pandas as pd
+import write_df.common
+from write_df.common import PreparedFrame, to_records
+from write_df.fanout import FanOutWriter, TargetResult
+from write_df.sql_writer import SQLDatabaseWriter
+
+
+def _get_data(size: int = 100):
+
+    return pd.DataFrame(
+        {
+            " city ": [f"city_{i}" for i in range(size)],
+            "population": pd.array(
+                [i if i % 10 else None for i in range(size)], dtype="Int64"
+            ),
+            "y": np.linspace(0, 1, size),
+        }
+    )
+
+
+def test_prepared_frame_records():
+    """Test that prepared records match direct conversion for derived frames."""
+
+    data = _get_data()
+    prepared = PreparedFrame(data=data)
+
+    assert prepared.to_records(data=prepared.data) == to_records(data=data)
+
+    subset = prepared.data[["y", " city "]].iloc[10:20]
+    assert prepared.to_records(data=subset) == to_records(data=subset)
+
+    filtered = prepared.data[prepared.data["y"] > 0.5]
+    assert prepared.to_records(data=filtered) == to_records(data=filtered)
+
+
+def test_fan_out_to_several_targets():
+    """Test writing one dataframe to several targets with per-target results."""
+
+    data = _get_data()
+    first = SQLDatabaseWriter(dbtype="sqlite", dbname=":memory:")
+    second = SQLDatabaseWriter(dbtype="duckdb", dbname=":memory:")
+    broken = SQLDatabaseWriter(dbtype="sqlite", dbname=":memory:")
+    broken.write_df_to_db(
+        data=pd.DataFrame({"other": [1]}), table_name="test__table__", id_col=None
+    )
+
+    writer = FanOutWriter()
+    writer.add_target("first", first, table_name="test__table__", id_col=None)
+    writer.add_target("second", second, table_name="test__table__", memory_limit=4096)
+    writer.add_target("broken", broken, table_name="test__table__", id_col=None)
+    assert writer.get_targets() == ["first", "second", "broken"]
+
+    results = writer.write(data=data)
+
+    assert set(results) == {"first", "second", "broken"}
+    for name in ("first", "second"):
+        assert isinstance(results[name], TargetResult)
+        assert results[name].error is None
+        assert results[name].elapsed >= 0
+    assert isinstance(results["broken"].error, ValueError)
+    assert list(data.columns)[0] == " city "
+
+    query = "SELECT city, population FROM test__table__ ORDER BY y"
+    for conn in (first, second):
+        res = conn.get_data_from_query(query=query)
+        assert res["city"].tolist() == data[" city "].tolist()
+        assert res["population"].isna().sum() == 10
+        conn.close_connection()
+    broken.close_connection()
+
+
+def test_fan_out_converts_timezones_per_target():
+    """Test that a SQLite target stores UTC while DuckDB keeps the zone."""
+
+    data = pd.DataFrame(
+        {"ts": pd.to_datetime(["2020-01-01 05:00"]).tz_localize("US/Eastern")}
+    )
+    first = SQLDatabaseWriter(dbtype="sqlite", dbname=":memory:")
+    second = SQLDatabaseWriter(dbtype="duckdb", dbname=":memory:")
+
+    writer = FanOutWriter()
+    writer.add_target("first", first, table_name="test__table__", id_col=None)
+    writer.add_target("second", second, table_name="test__table__", id_col=None)
+    results = writer.write(data=data)
+
+    assert all(result.error is None for result in results.values())
+    for conn in (first, second):
+        res = conn.get_data_from_query(query="SELECT ts FROM test__table__")
+        assert pd.to_datetime(res["ts"], utc=True)[0] == data["ts"][0]
+        conn.close_connection()
+
+
+def test_fan_out_converts_columns_on_demand(monkeypatch):
+    """Test that columns are converted once, and not at all for DuckDB alone."""
+
+    calls = []
+    convert = write_df.common.column_values
+
+    def _column_values(series):
+
+        calls.append(series.name)
+
+        return convert(series)
+
+    monkeypatch.setattr(write_df.common, "column_values", _column_values)
+    data = _get_data()
+
+    duckdb = SQLDatabaseWriter(dbtype="duckdb", dbname=":memory:")
+    writer = FanOutWriter()
+    writer.add_target("duckdb", duckdb, table_name="test__table__", id_col=None)
+    writer.write(data=data)
+    assert calls == []
+
+    first = SQLDatabaseWriter(dbtype="sqlite", dbname=":memory:")
+    second = SQLDatabaseWriter(dbtype="sqlite", dbname=":memory:")
+    writer.add_target("first", first, table_name="test__table__", id_col=None)
+    writer.add_target("second", second, table_name="test__table__", memory_limit=4096)
+    results = writer.write(data=data)
+
+    assert all(result.error is None for result in results.values())
+    assert sorted(calls) == sorted(data.columns)
+    for conn in (duckdb, first, second):
+        conn.close_connection()
@@ -0,0 +1,63 @@
+"""Test import cost of the write_df package"""
+
+import json
+import subprocess
+import sys
+
+IMPORT_BUDGET = 0.05
+HEAVY_MODULES = ("pandas", "sqlalchemy", "sqlalchemy_utils", "pymongo")
+
+
+def _import_in_subprocess(module: str):
+
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    ).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_package_is_cheap():
+    """Test that `import write_df` loads no heavy dependency and stays in budget."""
+
+    result = _import_in_subprocess(module="write_df")
+
+    for module in HEAVY_MODULES:
+        assert module not in result["modules"]
+    assert result["elapsed"] < IMPORT_BUDGET
+
+
+def test_import_nosql_writer_skips_sql_dependencies():
+    """Test that the NoSQL writer module does not load SQL or driver modules."""
+
+    result = _import_in_subprocess(module="write_df.nosql_writer")
+
+    for module in HEAVY_MODULES:
+        assert module not in result["modules"]
+
+
+def test_import_sql_writer_skips_nosql_dependencies():
+    """Test that the SQL writer module does not load pymongo or helpers."""
+
+    result = _import_in_subprocess(module="write_df.sql_writer")
+
+    assert "pymongo" not in result["modules"]
+    assert "sqlalchemy_utils" not in result["modules"]
+    assert "sqlalchemy.orm" not in result["modules"]
+
+
+def test_lazy_writer_attributes():
+    """Test that writers are reachable from the package namespace."""
+
+    import write_df
+    from write_df.sql_writer import SQLDatabaseWriter
+
+    assert write_df.SQLDatabaseWriter is SQLDatabaseWriter
+    assert "NoSQLDatabaseWriter" in dir(write_df)
@@ -80,6 +80,48 @@ class TestNoSQLDatabaseWriter:
         collection_names = conn.get_list_of_collections()
         assert collection_name in collection_names
 
+    def test_write_to_collection_with_processes(self, conn: NoSQLDatabaseWriter):
+        """Test writing data to collections with documents built in a process pool."""
+
+        response = get(url="https://people.sc.fsu.edu/~jburkardt/data/csv/cities.csv")
+        assert response.status_code == 200
+
+        data = pd.read_csv(StringIO(response.content.decode()))
+
+        collection_name = "_test_collection_"
+
+        count_initial = conn.get_document_count(collection_name=collection_name)
+
+        res = conn.write_data_to_collection(
+            collection_name=collection_name, data=data, processes=2
+        )
+        assert isinstance(res, results.InsertManyResult)
+
+        count_new = conn.get_document_count(collection_name=collection_name)
+        assert len(res.inserted_ids) == count_new - count_initial
+        assert len(res.inserted_ids) == data.shape[0]
+
+    def test_write_to_collection_with_memory_limit(self, conn: NoSQLDatabaseWriter):
+        """Test writing data to collections in batches bounded by a memory limit."""
+
+        response = get(url="https://people.sc.fsu.edu/~jburkardt/data/csv/cities.csv")
+        assert response.status_code == 200
+
+        data = pd.read_csv(StringIO(response.content.decode()))
+
+        collection_name = "_test_collection_"
+
+        count_initial = conn.get_document_count(collection_name=collection_name)
+
+        res = conn.write_data_to_collection(
+            collection_name=collection_name, data=data, memory_limit=4 * 1024
+        )
+        assert isinstance(res, results.InsertManyResult)
+
+        count_new = conn.get_document_count(collection_name=collection_name)
+        assert len(res.inserted_ids) == count_new - count_initial
+        assert len(res.inserted_ids) == data.shape[0]
+
     def test_delete_collection(self, conn: NoSQLDatabaseWriter):
         """Test collection dropping."""
 
@@ -0,0 +1,233 @@
+"""Test profiling entry point"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from write_df.common import WriteStats
+from write_df.profile import (
+    _get_insert_counter,
+    format_results,
+    main,
+    profile_modes,
+    recommend,
+)
+
+
+class FakeTarget:
+    """Target recording its writes with a fixed load time per call"""
+
+    def __init__(self) -> None:
+        self.writes = []
+
+    def write(self, data, options: dict):
+
+        self.writes.append(options)
+        stats = WriteStats()
+        stats.stages = {"schema": 0.5 if len(self.writes) == 1 else 0.01}
+        stats.stages["load"] = 0.1
+        stats.statements = 1
+        stats.bytes_sent = 2048
+
+        return stats
+
+
+def _get_result(mode: str, options: dict, rows_per_second: float, peak_bytes):
+
+    return {
+        "mode": mode,
+        "options": options,
+        "error": None,
+        "seconds": 1.0,
+        "rows_per_second": rows_per_second,
+        "peak_bytes": peak_bytes,
+        "statements": 2,
+        "stages": {"prepare": 0.0, "schema": 0.1, "load": 0.9},
+    }
+
+
+def _get_data(size: int = 200):
+
+    return pd.DataFrame(
+        {
+            "name": [f"name_{i}" for i in range(size)],
+            "value": np.linspace(0, 1, size),
+            "count": pd.array([i if i % 3 else None for i in range(size)], "Int64"),
+        }
+    )
+
+
+def test_write_stats_stages():
+    """Test that stage timings accumulate."""
+
+    stats = WriteStats()
+    with stats.stage("load"):
+        pass
+    with stats.stage("load"):
+        pass
+
+    assert list(stats.stages) == ["load"]
+    assert stats.total == stats.stages["load"]
+    assert stats.statements is None
+
+
+def test_profile_all_modes(tmp_path, capsys):
+    """Test profiling every mode against the SQLite stand-in."""
+
+    path = tmp_path / "sample.csv"
+    _get_data().to_csv(path, index=False)
+
+    status = main([str(path), "--processes", "2", "--memory-limit", "4096"])
+    output = capsys.readouterr().out
+
+    assert status == 0
+    assert "Profiled 200 rows x 3 columns on sqlite" in output
+    for mode in ("row", "chunked", "bulk"):
+        assert f"\n{mode} " in output
+    assert "Skipping `parallel`" in output
+    assert "Fastest mode is" in output
+
+
+def test_recommendations():
+    """Test recommendations for schema bound and row by row loads."""
+
+    data = _get_data()
+    results = [
+        {
+            "mode": "row",
+            "options": {"memory_limit": 1},
+            "error": None,
+            "seconds": 2.0,
+            "rows_per_second": 100.0,
+            "peak_bytes": None,
+            "statements": 205,
+            "stages": {"prepare": 0.0, "schema": 0.1, "load": 1.9},
+        },
+        {
+            "mode": "bulk",
+            "options": {},
+            "error": None,
+            "seconds": 0.2,
+            "rows_per_second": 1000.0,
+            "peak_bytes": None,
+            "statements": 5,
+            "stages": {"prepare": 0.0, "schema": 0.15, "load": 0.05},
+        },
+        {"mode": "parallel", "options": {"processes": 2}, "error": OSError("down")},
+    ]
+
+    lines = recommend(results, data=data, convert_seconds=0.01)
+    assert "`bulk`" in lines[0]
+    assert "the default settings" in lines[0]
+    assert any("Schema creation" in line for line in lines)
+
+    table = format_results(results)
+    assert "failed: OSError: down" in table
+    assert len(table.splitlines()) == 4
+
+
+def test_per_row_advice_only_for_round_trips():
+    """Test that one command per row is only reported for round trip counts."""
+
+    data = _get_data()
+    result = _get_result("row", {"memory_limit": 1}, 100.0, None)
+    result["statements"] = data.shape[0]
+
+    def _has_advice(round_trips: bool):
+
+        lines = recommend(
+            [result], data=data, convert_seconds=0.0, round_trips=round_trips
+        )
+
+        return any("one command per row" in line for line in lines)
+
+    assert _has_advice(round_trips=True)
+    assert not _has_advice(round_trips=False)
+
+
+def test_profile_modes_warm_up_and_load_rate():
+    """Test that a warm-up write runs first and modes are rated on load time."""
+
+    target = FakeTarget()
+    data = _get_data()
+    options = {"bulk": {}, "chunked": {"memory_limit": 4096}}
+
+    results = profile_modes(
+        target=target,
+        data=data,
+        modes=["bulk", "chunked"],
+        options=options,
+        memory=False,
+    )
+
+    assert target.writes == [{}, {}, {"memory_limit": 4096}]
+    assert [result["rows_per_second"] for result in results] == pytest.approx(
+        [data.shape[0] / 0.1] * 2
+    )
+    assert results[0]["stages"]["schema"] == 0.01
+    assert results[0]["bytes_sent"] == 2048
+    assert format_results(results).splitlines()[1].split()[5] == "2.0"
+
+
+def test_insert_counter_sums_command_bytes():
+    """Test that the Mongo listener sums the encoded size of insert commands."""
+
+    import bson
+
+    counter = _get_insert_counter()
+    command = {"insert": "c", "documents": [{"a": 1}, {"a": 2}]}
+    counter.started(SimpleNamespace(command_name="insert", command=command))
+    counter.started(SimpleNamespace(command_name="find", command={"find": "c"}))
+
+    assert counter.count == 1
+    assert counter.bytes == len(bson.encode(command))
+
+
+def test_recommendations_prefer_simpler_tie():
+    """Test that a mode within 10% of the fastest but with fewer options wins."""
+
+    data = _get_data()
+    results = [
+        _get_result("chunked", {"memory_limit": 4096}, 1050.0, None),
+        _get_result("bulk", {}, 1000.0, None),
+    ]
+
+    lines = recommend(results, data=data, convert_seconds=0.0)
+    assert "`bulk`" in lines[0]
+
+
+def test_memory_advice_only_when_chunked_lower():
+    """Test that memory advice needs a clearly lower chunked peak."""
+
+    data = _get_data()
+    frame_bytes = int(data.memory_usage(deep=True).sum())
+    big = 10 * frame_bytes
+
+    same = [
+        _get_result("bulk", {}, 1000.0, big),
+        _get_result("chunked", {"memory_limit": 4096}, 500.0, big),
+    ]
+    lower = [
+        _get_result("bulk", {}, 1000.0, big),
+        _get_result("chunked", {"memory_limit": 4096}, 500.0, big // 4),
+    ]
+
+    assert not any(
+        "memory_limit=" in line
+        for line in recommend(same, data=data, convert_seconds=0.0)
+    )
+    assert any(
+        "memory_limit=" in line
+        for line in recommend(lower, data=data, convert_seconds=0.0)
+    )
+
+
+def test_profile_compress_unsupported(tmp_path):
+    """Test that `--compress` is refused on a backend without compression."""
+
+    path = tmp_path / "sample.csv"
+    _get_data().to_csv(path, index=False)
+
+    with pytest.raises(ValueError):
+        main([str(path), "--modes", "bulk", "--compress"])
@@ -0,0 +1,30 @@
+"""Package write dataframe to database module
+
+Writers are loaded on first access so that `import write_df` does not pull in
+pandas, SQLAlchemy or any database driver.
+"""
+
+from importlib import import_module
+
+__all__ = ["SQLDatabaseWriter", "NoSQLDatabaseWriter"]
+
+_lazy_attributes = {
+    "SQLDatabaseWriter": "write_df.sql_writer",
+    "NoSQLDatabaseWriter": "write_df.nosql_writer",
+}
+
+
+def __getattr__(name: str):
+
+    if name not in _lazy_attributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(_lazy_attributes[name]), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,602 @@
+"""Database backends for the dataframe writers
+
+Every `dbtype` accepted by the writers is a backend registered here. A backend
+declares how to connect, which introspection queries to run, how dataframe
+columns map to database types and how rows are loaded, so dialect specific
+behavior stays out of the writers.
+
+Third party packages can add backends through the `write_df.backends` entry
+point group. The entry point must resolve to a `SQLBackend` or `NoSQLBackend`
+instance, or to a callable returning one.
+"""
+
+import re
+import warnings
+from importlib import import_module
+
+from write_df.common import to_records
+
+__all__ = [
+    "SQLBackend",
+    "NoSQLBackend",
+    "register_backend",
+    "get_backend",
+    "list_backends",
+    "dialect_type",
+]
+
+ENTRY_POINT_GROUP = "write_df.backends"
+
+_nextval = re.compile(r"nextval\('([^']+)'")
+
+
+def dialect_type(dialect: str, name: str, **options):
+    """Get a factory of the dialect specific type `name` for a `type_map`.
+
+    The dialect module is imported when the type is first needed, so
+    declaring a backend does not import SQLAlchemy.
+
+    :param dialect: Module name in `sqlalchemy.dialects`, e.g. `"mysql"`.
+    :type dialect: `str`
+    :param name: Type name in that module, e.g. `"DATETIME"`.
+    :type name: `str`
+    :param options: Keyword arguments of the type, e.g. `fsp=6`.
+    :return: Callable taking `max_length` and returning the type.
+    """
+
+    def factory(max_length: int):
+
+        module = import_module(f"sqlalchemy.dialects.{dialect}")
+
+        return getattr(module, name)(**options)
+
+    return factory
+
+
+class SQLBackend:
+    """Backend for a SQL database reached through SQLAlchemy
+
+    :param name: Value of `dbtype` selecting this backend.
+    :type name: `str`
+    :param dialect: SQLAlchemy dialect name.
+    :type dialect: `str`
+    :param driver: SQLAlchemy driver suffix, e.g. `"+psycopg2"`.
+    :type driver: `str`
+    :param queries: Introspection queries `db_list`, `table_list` and
+        `column_info`, formatted with the database name and the table name.
+    :type queries: `dict[str, str]`
+    :param compress_args: Driver connect arguments turning on protocol compression.
+    :type compress_args: `dict`, optional
+    :param engine_options: Default keyword arguments for `sqlalchemy.create_engine`.
+    :type engine_options: `dict`, optional
+    :param type_map: Types for the column kinds `integer`, `biginteger`,
+        `unsigned_biginteger`, `float`, `boolean`, `datetime`, `datetime_tz`,
+        `decimal` and `string`. A value is the name or class of a generic
+        SQLAlchemy type, a type instance used as is, or a callable taking
+        `max_length` and returning a type, e.g. from `dialect_type`.
+    :type type_map: `dict`, optional
+    :param capabilities: Optional features supported, e.g. `"compress"` for
+        protocol compression, `"timezone"` for a time zone aware datetime
+        type or `"zero_copy"` for loading the dataframe without converting it
+        to Python values.
+    :type capabilities: `set[str]`, optional
+    """
+
+    default_type_map = {
+        "integer": "Integer",
+        "biginteger": "BigInteger",
+        "unsigned_biginteger": "Numeric",
+        "float": "Float",
+        "boolean": "Boolean",
+        "datetime": "DateTime",
+        "datetime_tz": "DateTime",
+        "decimal": "Numeric",
+        "string": "String",
+    }
+
+    def __init__(
+        self,
+        name: str,
+        dialect: str,
+        driver: str,
+        queries: dict,
+        compress_args: dict = None,
+        engine_options: dict = None,
+        type_map: dict = None,
+        capabilities: set = None,
+    ) -> None:
+        self.name = name
+        self.dialect = dialect
+        self.driver = driver
+        self.queries = queries
+        self.compress_args = compress_args
+        self.engine_options = engine_options or {}
+        self.type_map = {**self.default_type_map, **(type_map or {})}
+        self.capabilities = frozenset(capabilities or ())
+
+    def get_url(self, host: str, dbname: str, user: str, password: str, port: int):
+        """Build the SQLAlchemy connection url.
+
+        :return: Connection url.
+        :rtype: `str`
+        """
+
+        credentials = {"host": host, "user": user, "password": password, "port": port}
+        for name, value in credentials.items():
+            assert value is not None, f"`{name}` is required for {self.name}"
+
+        return f"{self.dialect}{self.driver}://{user}:{password}@{host}:{port}/{dbname}"
+
+    def get_engine_options(self, dbname: str):
+        """Get default keyword arguments for `sqlalchemy.create_engine`.
+
+        :param dbname: Name of the database.
+        :type dbname: `str`
+        :return: Engine keyword arguments.
+        :rtype: `dict`
+        """
+
+        return dict(self.engine_options)
+
+    def configure_engine(self, engine):
+        """Hook called once on a newly created engine."""
+
+    def create_database(self, engine):
+        """Create the database of `engine` if it does not exist yet."""
+
+        from sqlalchemy_utils import create_database, database_exists
+
+        if not database_exists(url=engine.url):
+            create_database(engine.url)
+
+    def get_query(self, name: str, *args):
+        """Get introspection query `name` filled with `args`.
+
+        :param name: One of `db_list`, `table_list` or `column_info`.
+        :type name: `str`
+        :return: SQL statement.
+        :rtype: `str`
+        """
+
+        return self.queries[name].format(*args)
+
+    def get_column_type(self, kind: str, max_length: int = 100):
+        """Get the SQLAlchemy type for column kind `kind`.
+
+        :param kind: One of the keys of `type_map`.
+        :type kind: `str`
+        :param max_length: Length of string columns, defaults to 100.
+        :type max_length: `int`
+        :return: SQLAlchemy column type.
+        """
+
+        import sqlalchemy
+
+        column_type = self.type_map[kind]
+        if isinstance(column_type, str):
+            column_type = getattr(sqlalchemy, column_type)
+        if not isinstance(column_type, type):
+            if callable(column_type):
+                return column_type(max_length=max_length)
+            return column_type
+        if kind == "string":
+            return column_type(max_length)
+        if kind == "datetime_tz":
+            return column_type(timezone=True)
+        if kind == "decimal":
+            return column_type(precision=38, scale=10, asdecimal=True)
+        if kind == "unsigned_biginteger" and issubclass(
+            column_type, sqlalchemy.Numeric
+        ):
+            return column_type(precision=20, scale=0, asdecimal=True)
+
+        return column_type
+
+    def get_id_column(self, name: str, table_name: str):
+        """Get the auto incrementing primary key column `name` of `table_name`.
+
+        :return: SQLAlchemy column.
+        :rtype: `sqlalchemy.Column`
+        """
+
+        from sqlalchemy import Column
+
+        return Column(
+            name, self.get_column_type("integer"), primary_key=True, nullable=False
+        )
+
+    def has_table(self, engine, connection, table_name: str):
+        """Check if the database behind `connection` has table `table_name`.
+
+        :return: True if the table exists.
+        :rtype: `bool`
+        """
+
+        return engine.dialect.has_table(connection=connection, table_name=table_name)
+
+    def get_bytes_sent(self, connection):
+        """Get the bytes the client has sent in the session of `connection`.
+
+        :return: Byte count, or None if the database does not report it.
+        :rtype: `int`
+        """
+
+        return None
+
+    def drop_table(self, connection, table_name: str):
+        """Drop table `table_name` on `connection` if it exists."""
+
+        from sqlalchemy import text
+
+        connection.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+
+    def bulk_load(self, connection, table, data, prepared=None):
+        """Insert all rows of `data` into `table` on `connection`.
+
+        A backend whose driver limits the rows or parameters of one statement
+        pages the rows here and still returns one result.
+
+        :param prepared: Prepared frame `data` was derived from, defaults to None.
+        :type prepared: `write_df.common.PreparedFrame`, optional
+        :return: Cursor with result of query execution.
+        :rtype: `sqlalchemy.engine.cursor.CursorResult`
+        """
+
+        records = to_records(data=data, prepared=prepared)
+
+        return connection.execute(table.insert(), records)
+
+
+class MySQLBackend(SQLBackend):
+    """Backend for MySQL, which counts the bytes of every session"""
+
+    def get_bytes_sent(self, connection):
+        """Read the session's `Bytes_received`, what the server received from this client."""
+
+        # a driver cursor keeps the query out of the statement count
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute("SHOW SESSION STATUS LIKE 'Bytes_received'")
+            return int(cursor.fetchone()[1])
+        finally:
+            cursor.close()
+
+
+class SQLServerBackend(SQLBackend):
+    """Backend for SQL Server, whose dialect names the table argument differently"""
+
+    def has_table(self, engine, connection, table_name: str):
+
+        return engine.dialect.has_table(connection=connection, tablename=table_name)
+
+
+class EmbeddedBackend(SQLBackend):
+    """Backend for an embedded database stored in the file `dbname`
+
+    Host, user, password and port are ignored. `":memory:"` keeps the database
+    in memory, shared by all connections of the writer.
+    """
+
+    def get_url(self, host: str, dbname: str, user: str, password: str, port: int):
+
+        return f"{self.dialect}{self.driver}:///{dbname}"
+
+    def get_engine_options(self, dbname: str):
+
+        options = super().get_engine_options(dbname=dbname)
+        if dbname == ":memory:":
+            from sqlalchemy.pool import StaticPool
+
+            options["poolclass"] = StaticPool
+
+        return options
+
+    def create_database(self, engine):
+        """Embedded databases are created on first connection."""
+
+
+class SQLiteBackend(EmbeddedBackend):
+    """Backend for SQLite using write-ahead logging
+
+    Rows are sent with a single `executemany` inside one transaction.
+    """
+
+    def get_engine_options(self, dbname: str):
+
+        options = super().get_engine_options(dbname=dbname)
+        options.setdefault("connect_args", {})["check_same_thread"] = False
+
+        return options
+
+    def configure_engine(self, engine):
+
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record):
+
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+
+class DuckDBBackend(EmbeddedBackend):
+    """Backend for DuckDB loading dataframes without a row by row copy
+
+    The dataframe is registered as a view on the DuckDB connection and the
+    table is filled with `INSERT ... SELECT` from it, so DuckDB scans the
+    column buffers directly.
+    """
+
+    def get_id_column(self, name: str, table_name: str):
+
+        from sqlalchemy import Column, Sequence
+
+        sequence = Sequence(f"{table_name}_{name}_seq")
+
+        return Column(
+            name,
+            self.get_column_type("integer"),
+            sequence,
+            server_default=sequence.next_value(),
+            primary_key=True,
+            nullable=False,
+        )
+
+    def has_table(self, engine, connection, table_name: str):
+        """Check for `table_name` in the current schema only.
+
+        The dialect also finds tables of the same name in other schemas.
+        """
+
+        from sqlalchemy import text
+
+        query = (
+            "SELECT count(*) FROM information_schema.tables "
+            "WHERE table_schema = current_schema() AND table_name = :table_name"
+        )
+
+        return bool(
+            connection.execute(text(query), {"table_name": table_name}).scalar()
+        )
+
+    def drop_table(self, connection, table_name: str):
+        """Drop table `table_name` together with the sequences of its id columns."""
+
+        from sqlalchemy import text
+
+        defaults = connection.execute(
+            text(
+                "SELECT column_default FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table_name"
+            ),
+            {"table_name": table_name},
+        ).scalars()
+        sequences = [
+            match.group(1)
+            for default in defaults
+            if default
+            for match in [_nextval.match(default)]
+            if match
+        ]
+
+        super().drop_table(connection=connection, table_name=table_name)
+        quote = connection.dialect.identifier_preparer.quote
+        for sequence in sequences:
+            connection.execute(text(f"DROP SEQUENCE IF EXISTS {quote(sequence)}"))
+
+    def bulk_load(self, connection, table, data, prepared=None):
+
+        from sqlalchemy import text
+
+        view_name = f"__write_df_{table.name}__"
+        quote = connection.dialect.identifier_preparer.quote
+        columns = ", ".join(quote(str(column)) for column in data.columns)
+        query = (
+            f"INSERT INTO {quote(table.name)} ({columns}) "
+            f"SELECT {columns} FROM {quote(view_name)}"
+        )
+
+        driver_connection = connection.connection.driver_connection
+        driver_connection.register(view_name, data)
+        try:
+            return connection.execute(text(query))
+        finally:
+            driver_connection.unregister(view_name)
+
+
+class NoSQLBackend:
+    """Backend for a NoSQL database
+
+    :param name: Value of `dbtype` selecting this backend.
+    :type name: `str`
+    :param writer: Writer class as `"module:attribute"`, imported on first use.
+    :type writer: `str`
+    :param capabilities: Optional features supported, e.g. `"compress"`.
+    :type capabilities: `set[str]`, optional
+    :param max_batch_rows: Most documents one insert may carry.
+    :type max_batch_rows: `int`, optional
+    """
+
+    def __init__(
+        self,
+        name: str,
+        writer: str,
+        capabilities: set = None,
+        max_batch_rows: int = None,
+    ) -> None:
+        self.name = name
+        self.writer = writer
+        self.capabilities = frozenset(capabilities or ())
+        self.max_batch_rows = max_batch_rows
+
+    def get_writer_class(self):
+        """Import and return the writer class of this backend."""
+
+        module, attribute = self.writer.split(":")
+
+        return getattr(import_module(module), attribute)
+
+
+_backends = {}
+_entry_points_loaded = False
+
+
+def register_backend(backend):
+    """Register `backend` under its name, replacing any backend of that name.
+
+    :param backend: Backend to register.
+    :type backend: `SQLBackend` or `NoSQLBackend`
+    :return: The registered backend.
+    """
+
+    _backends[backend.name] = backend
+
+    return backend
+
+
+def _load_entry_points():
+
+    global _entry_points_loaded
+
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+
+    from importlib.metadata import entry_points
+
+    found = entry_points()
+    if hasattr(found, "select"):
+        found = found.select(group=ENTRY_POINT_GROUP)
+    else:
+        found = found.get(ENTRY_POINT_GROUP, [])
+
+    for entry_point in found:
+        try:
+            backend = entry_point.load()
+            if callable(backend):
+                backend = backend()
+        except Exception as error:
+            warnings.warn(
+                f"Could not load backend `{entry_point.name}` from "
+                f"{ENTRY_POINT_GROUP}: {error}",
+                RuntimeWarning,
+            )
+            continue
+        register_backend(backend)
+
+
+def list_backends(kind: type = None):
+    """List names of registered backends.
+
+    :param kind: If set, only backends of this class are listed.
+    :type kind: `type`, optional
+    :return: Backend names.
+    :rtype: `list[str]`
+    """
+
+    _load_entry_points()
+
+    return [
+        name
+        for name, backend in _backends.items()
+        if kind is None or isinstance(backend, kind)
+    ]
+
+
+def get_backend(dbtype: str):
+    """Get the backend registered for `dbtype`.
+
+    :param dbtype: Name of the backend.
+    :type dbtype: `str`
+    :return: Backend for `dbtype` or None if not registered.
+    """
+
+    _load_entry_points()
+
+    return _backends.get(dbtype)
+
+
+register_backend(
+    SQLServerBackend(
+        name="sqlserver",
+        dialect="mssql",
+        driver="+pymssql",
+        queries={
+            "db_list": "SELECT name FROM master.sys.databases;",
+            "table_list": "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_CATALOG='{}';",
+            "column_info": "select * from information_schema.columns WHERE TABLE_CATALOG='{}' AND TABLE_SCHEMA = 'dbo' AND TABLE_NAME = '{}';",
+        },
+        type_map={
+            "datetime": dialect_type("mssql", "DATETIME2"),
+            "datetime_tz": dialect_type("mssql", "DATETIMEOFFSET"),
+        },
+        capabilities={"timezone"},
+    )
+)
+register_backend(
+    MySQLBackend(
+        name="mysql",
+        dialect="mysql",
+        driver="+mysqldb",
+        queries={
+            "db_list": "SHOW DATABASES;",
+            "table_list": "SHOW TABLES FROM `{}`",
+            "column_info": "select * from information_schema.columns WHERE table_schema='{}' and table_name='{}';",
+        },
+        compress_args={"compress": True},
+        type_map={
+            "float": dialect_type("mysql", "DOUBLE", asdecimal=False),
+            "datetime": dialect_type("mysql", "DATETIME", fsp=6),
+            "datetime_tz": dialect_type("mysql", "DATETIME", fsp=6),
+        },
+        capabilities={"compress"},
+    )
+)
+register_backend(
+    SQLBackend(
+        name="postgresql",
+        dialect="postgresql",
+        driver="+psycopg2",
+        queries={
+            "db_list": "select datname from pg_database;",
+            "table_list": "select * from pg_catalog.pg_tables where schemaname='{}';",
+            "column_info": "select * from information_schema.columns WHERE table_catalog='{}' and table_name='{}'",
+        },
+        capabilities={"timezone"},
+    )
+)
+register_backend(
+    SQLiteBackend(
+        name="sqlite",
+        dialect="sqlite",
+        driver="",
+        queries={
+            "db_list": "SELECT name FROM pragma_database_list;",
+            "table_list": "SELECT name FROM sqlite_master WHERE type = 'table';",
+            "column_info": "SELECT name AS column_name, CASE WHEN \"notnull\" = 1 THEN 'NO' ELSE 'YES' END AS is_nullable FROM pragma_table_info('{1}');",
+        },
+        type_map={"unsigned_biginteger": "BigInteger"},
+    )
+)
+register_backend(
+    DuckDBBackend(
+        name="duckdb",
+        dialect="duckdb",
+        driver="",
+        queries={
+            "db_list": "SELECT database_name FROM duckdb_databases();",
+            "table_list": "SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema();",
+            "column_info": "select * from information_schema.columns WHERE table_schema = current_schema() AND table_name = '{1}';",
+        },
+        capabilities={"timezone", "zero_copy"},
+    )
+)
+register_backend(
+    NoSQLBackend(
+        name="mongo",
+        writer="write_df.nosql_writer:MongoDatabaseWriter",
+        capabilities={"compress"},
+    )
+)
@@ -0,0 +1,181 @@
+"""Result cache for read queries of the dataframe writers"""
+
+import re
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock
+
+__all__ = ["QueryCache", "normalize_query"]
+
+_identifier = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+_whitespace = re.compile(r"\s+")
+_literal = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+
+
+def normalize_query(query: str):
+    """Normalize `query` text so that equivalent spellings share a cache key.
+
+    Whitespace runs outside quoted literals and identifiers are collapsed and a
+    trailing semicolon is dropped. Quoted text and case are kept as written
+    since they are significant inside string literals.
+
+    :param query: Query text.
+    :type query: `str`
+    :return: Normalized query text.
+    :rtype: `str`
+    """
+
+    parts = []
+    position = 0
+    for literal in _literal.finditer(query):
+        parts.append(_whitespace.sub(" ", query[position : literal.start()]))
+        parts.append(literal.group())
+        position = literal.end()
+    parts.append(_whitespace.sub(" ", query[position:]))
+
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+
+def _get_size(value):
+
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(item) for item in value)
+
+    return sys.getsizeof(value)
+
+
+def _copy(value):
+
+    if hasattr(value, "copy"):
+        return value.copy()
+
+    return value
+
+
+class QueryCache:
+    """Least recently used cache of query results bounded in bytes
+
+    Every entry remembers the tables it depends on. By default these are all
+    identifiers appearing in the query text, so invalidating a table drops
+    every cached query that mentions it. Entries stored with the table `"*"`
+    are dropped on any invalidation.
+
+    :param max_bytes: Upper bound of the total size of cached results.
+    :type max_bytes: `int`
+    :param ttl: Seconds an entry stays valid, defaults to None for no expiry.
+    :type ttl: `float`, optional
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = None) -> None:
+        assert max_bytes > 0, "`max_bytes` must be positive"
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.__entries = OrderedDict()
+        self.__size = 0
+        self.__lock = Lock()
+
+    def __len__(self):
+
+        return len(self.__entries)
+
+    @property
+    def size(self):
+        """Total size in bytes of the cached results."""
+
+        return self.__size
+
+    def _remove(self, key):
+
+        entry = self.__entries.pop(key)
+        self.__size -= entry["size"]
+
+    def get(self, query: str, default=None):
+        """Get the cached result of `query`.
+
+        :param query: Query text.
+        :type query: `str`
+        :param default: Value returned on a miss, defaults to None.
+        :return: Copy of the cached result or `default`.
+        """
+
+        key = normalize_query(query)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return default
+            if entry["expires"] is not None and entry["expires"] < time.monotonic():
+                self._remove(key)
+                return default
+
+            self.__entries.move_to_end(key)
+
+            return _copy(entry["value"])
+
+    def set(self, query: str, value, tables=None):
+        """Cache `value` as the result of `query`.
+
+        Results larger than `max_bytes` are not cached. Least recently used
+        entries are evicted until the new result fits.
+
+        :param query: Query text.
+        :type query: `str`
+        :param value: Result of the query.
+        :param tables: Tables the result depends on, defaults to the
+            identifiers in `query`.
+        :type tables: `list[str]`, optional
+        """
+
+        key = normalize_query(query)
+        size = _get_size(value)
+        if size > self.max_bytes:
+            return
+
+        if tables is None:
+            tables = _identifier.findall(key)
+
+        expires = None
+        if self.ttl is not None:
+            expires = time.monotonic() + self.ttl
+
+        with self.__lock:
+            if key in self.__entries:
+                self._remove(key)
+            while self.__entries and self.__size + size > self.max_bytes:
+                self._remove(next(iter(self.__entries)))
+
+            self.__entries[key] = {
+                "value": _copy(value),
+                "size": size,
+                "tables": frozenset(table.lower() for table in tables),
+                "expires": expires,
+            }
+            self.__size += size
+
+    def invalidate(self, table: str):
+        """Drop cached results depending on `table`.
+
+        :param table: Name of the table or collection.
+        :type table: `str`
+        """
+
+        table = table.lower()
+        with self.__lock:
+            stale = [
+                key
+                for key, entry in self.__entries.items()
+                if table in entry["tables"] or "*" in entry["tables"]
+            ]
+            for key in stale:
+                self._remove(key)
+
+    def clear(self):
+        """Drop all cached results."""
+
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
@@ -1,33 +1,480 @@
 """Common variables for dataframe to database module"""
 
+import sys
+import threading
+import time
+from contextlib import contextmanager
 
-saved_values = {
-    "sqlserver": {
-        "dialect": "mssql",
-        "driver": "+pymssql",
-        "query": {
-            "db_list": "SELECT name FROM master.sys.databases;",
-            "table_list": "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_CATALOG='{}';",
-            "column_info": "select * from information_schema.columns WHERE TABLE_CATALOG='{}' AND TABLE_SCHEMA = 'dbo' AND TABLE_NAME = '{}';",
-        },
-    },
-    "mysql": {
-        "dialect": "mysql",
-        "driver": "+mysqldb",
-        "query": {
-            "db_list": "SHOW DATABASES;",
-            "table_list": "SHOW TABLES FROM `{}`",
-            "column_info": "select * from information_schema.columns WHERE table_schema='{}' and table_name='{}';",
-        },
-    },
-    "postgresql": {
-        "dialect": "postgresql",
-        "driver": "+psycopg2",
-        "query": {
-            "db_list": "select datname from pg_database;",
-            "table_list": "select * from pg_catalog.pg_tables where schemaname='{}';",
-            "column_info": "select * from information_schema.columns WHERE table_catalog='{}' and table_name='{}'",
-        },
-    },
-}
-nosql_dbtypes = ["mongo"]
+
+class WriteStats:
+    """Stage timings and statement count of one write
+
+    `stages` maps a stage name to its wall time in seconds. `statements` is
+    the number of statements executed, where one `executemany` counts once
+    however many round trips the driver makes for it. `bytes_sent` is the
+    bytes sent to the database while loading. Each is None where it is not
+    tracked.
+    """
+
+    def __init__(self) -> None:
+        self.stages = {}
+        self.statements = None
+        self.bytes_sent = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """Add the time spent in the `with` block to stage `name`."""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    @property
+    def total(self):
+        """Total wall time of all stages in seconds."""
+
+        return sum(self.stages.values())
+
+
+def column_values(series):
+    """Convert column `series` to a list of native Python values.
+
+    Values come out as the driver ready Python type of the column's dtype:
+    `int` for integer columns including nullable `Int64`, `bool`, `float`,
+    `str`, `Decimal` and `pd.Timestamp` for datetimes, with or without a
+    time zone. Every null (`NaN`, `NaT`, `pd.NA`) becomes None.
+
+    :param series: Column to convert.
+    :type series: `pd.Series`
+    :return: Values of the column.
+    :rtype: `list`
+    """
+
+    values = series.tolist()
+
+    nulls = series.isna().to_numpy()
+    if nulls.any():
+        values = [None if null else value for value, null in zip(values, nulls)]
+
+    return values
+
+
+def _values_to_records(columns, values):
+
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def _chunk_to_records(data):
+
+    columns = [str(column) for column in data.columns]
+    values = [column_values(data.iloc[:, i]) for i in range(data.shape[1])]
+
+    return _values_to_records(columns=columns, values=values)
+
+
+class _LazyValues:
+    """Converted values of the columns of a frame, built on first access"""
+
+    def __init__(self, data) -> None:
+        self.__data = data
+        self.__values = {}
+        self.__lock = threading.Lock()
+
+    def get(self, position: int):
+        """Get the converted values of the column at `position`."""
+
+        with self.__lock:
+            if position not in self.__values:
+                self.__values[position] = column_values(self.__data.iloc[:, position])
+
+            return self.__values[position]
+
+
+class PreparedFrame:
+    """Dataframe whose column values are converted to Python values once
+
+    Pass it instead of the dataframe to `write_df_to_db` or
+    `write_data_to_collection` to write the same data to several targets
+    without converting it again for each of them. The rows are renumbered
+    from 0 so that slices of the frame map to slices of the converted values.
+
+    A column is converted the first time a target needs it, so targets that
+    load the dataframe directly, such as DuckDB, cost nothing. Once built,
+    the values of a column cover every row and are kept as long as the
+    prepared frame is alive. A target's `memory_limit` bounds its own batch
+    copies but not these shared values; write a plain dataframe instead
+    where the converted frame does not fit in memory.
+
+    :param data: Dataframe to prepare.
+    :type data: `pd.DataFrame`
+    """
+
+    def __init__(
+        self,
+        data,
+        source: _LazyValues = None,
+        positions: dict = None,
+        overrides: dict = None,
+    ) -> None:
+        if source is None:
+            data = data.copy(deep=False)
+            data.index = range(data.shape[0])
+            source = _LazyValues(data=data)
+            positions = {str(column): i for i, column in enumerate(data.columns)}
+
+        self.data = data
+        self.__source = source
+        self.__positions = positions
+        self.__overrides = overrides or {}
+
+    def get_values(self, column):
+        """Get the converted values of column `column` for every row.
+
+        :param column: Name of the column.
+        :return: Values of the column.
+        :rtype: `list`
+        """
+
+        column = str(column)
+        if column in self.__overrides:
+            return self.__overrides[column]
+
+        return self.__source.get(self.__positions[column])
+
+    def rename(self, mapper):
+        """Rename columns with the function `mapper`, sharing the converted values.
+
+        :param mapper: Function from old to new column name.
+        :type mapper: `callable`
+        :return: Renamed prepared frame.
+        :rtype: `PreparedFrame`
+        """
+
+        data = self.data.copy(deep=False)
+        data.columns = [mapper(column) for column in data.columns]
+
+        return PreparedFrame(
+            data=data,
+            source=self.__source,
+            positions={
+                str(mapper(column)): position
+                for column, position in self.__positions.items()
+            },
+            overrides={
+                str(mapper(column)): values
+                for column, values in self.__overrides.items()
+            },
+        )
+
+    def replace(self, data, columns):
+        """Convert `columns` of `data` again, sharing the other converted values.
+
+        :param data: Frame derived from `self.data` with `columns` changed.
+        :type data: `pd.DataFrame`
+        :param columns: Names of the changed columns.
+        :type columns: `list`
+        :return: Prepared frame of `data`.
+        :rtype: `PreparedFrame`
+        """
+
+        overrides = dict(self.__overrides)
+        for column in columns:
+            overrides[str(column)] = column_values(data[column])
+
+        return PreparedFrame(
+            data=data,
+            source=self.__source,
+            positions=self.__positions,
+            overrides=overrides,
+        )
+
+    def to_records(self, data):
+        """Get row dictionaries for the rows and columns of `data`.
+
+        :param data: Frame derived from `self.data` by selecting rows or columns.
+        :type data: `pd.DataFrame`
+        :return: Row dictionaries in the order of `data`.
+        :rtype: `list[dict]`
+        """
+
+        columns = [str(column) for column in data.columns]
+        values = [self.get_values(column) for column in columns]
+        rows = data.index
+        if getattr(rows, "step", None) == 1:
+            values = [value[rows.start : rows.stop] for value in values]
+        else:
+            positions = rows.tolist()
+            values = [[value[i] for i in positions] for value in values]
+
+        return _values_to_records(columns=columns, values=values)
+
+
+def to_records(data, prepared: PreparedFrame = None):
+    """Convert dataframe `data` to a list of row dictionaries.
+
+    Column values are converted with `column_values`, so rows hold native
+    Python values and None for nulls.
+
+    :param data: Dataframe to convert.
+    :type data: `pd.DataFrame`
+    :param prepared: Prepared frame `data` was derived from. Its converted
+        values are used instead of converting `data`, defaults to None.
+    :type prepared: `PreparedFrame`, optional
+    :return: Row dictionaries in the order of `data`.
+    :rtype: `list[dict]`
+    """
+
+    if prepared is not None:
+        return prepared.to_records(data=data)
+
+    return _chunk_to_records(data)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_process_pool(processes: int):
+    """Get the process pool with `processes` workers, created on first use.
+
+    Pools are kept for the lifetime of the interpreter and shared by all
+    writers, so worker processes are started once rather than per write.
+    Workers are started from a fork server (spawned where there is none)
+    because a pool may be created from a writer thread while other threads
+    hold locks, which a forked child would inherit locked.
+
+    :param processes: Number of worker processes.
+    :type processes: `int`
+    :return: Process pool.
+    :rtype: `concurrent.futures.ProcessPoolExecutor`
+    """
+
+    with _pools_lock:
+        pool = _pools.get(processes)
+        if pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            method = "spawn"
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                method = "forkserver"
+            pool = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context(method)
+            )
+            _pools[processes] = pool
+
+    return pool
+
+
+def _discard_process_pool(processes: int, pool):
+
+    with _pools_lock:
+        if _pools.get(processes) is pool:
+            del _pools[processes]
+    pool.shutdown(wait=False)
+
+
+class _SharedChunk:
+    """Rows `start` to `stop` of a `SharedFrame`, sent to a worker process"""
+
+    def __init__(self, columns: list, specs: list, length: int, start: int, stop: int):
+        self.columns = columns
+        self.specs = specs
+        self.length = length
+        self.start = start
+        self.stop = stop
+
+    def _load_column(self, spec):
+
+        import numpy as np
+        import pandas as pd
+
+        if spec[0] == "local":
+            return spec[1]
+
+        from multiprocessing.shared_memory import SharedMemory
+
+        _, name, dtype, tz = spec
+        block = SharedMemory(name=name)
+        try:
+            buffer = np.ndarray((self.length,), dtype=dtype, buffer=block.buf)
+            series = pd.Series(buffer[self.start : self.stop].copy())
+            del buffer
+        finally:
+            block.close()
+
+        if tz is not None:
+            series = series.dt.tz_localize("UTC").dt.tz_convert(tz)
+
+        return series
+
+    def to_records(self):
+        """Convert the rows of this chunk to row dictionaries.
+
+        :return: Row dictionaries in the order of the rows.
+        :rtype: `list[dict]`
+        """
+
+        values = [column_values(self._load_column(spec)) for spec in self.specs]
+
+        return _values_to_records(columns=self.columns, values=values)
+
+
+def _encode_chunk(chunk: _SharedChunk, encode):
+
+    return encode(chunk.to_records())
+
+
+class SharedFrame:
+    """Dataframe whose numeric columns are placed in shared memory
+
+    Worker processes read the numeric, boolean and datetime columns straight
+    from shared memory blocks, so only the remaining object and extension
+    columns are pickled, and only the rows of each worker's slice. Use it as
+    a context manager so that the blocks are released after the write.
+
+    :param data: Dataframe to share.
+    :type data: `pd.DataFrame`
+    """
+
+    def __init__(self, data) -> None:
+        import numpy as np
+        import pandas as pd
+        from multiprocessing.shared_memory import SharedMemory
+
+        self.length = data.shape[0]
+        self.columns = [str(column) for column in data.columns]
+        self.__blocks = []
+        self.__specs = []
+
+        for i in range(data.shape[1]):
+            series = data.iloc[:, i]
+            tz = None
+            if isinstance(series.dtype, pd.DatetimeTZDtype):
+                tz = series.dtype.tz
+                values = series.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy()
+            elif isinstance(series.dtype, np.dtype) and series.dtype.kind in "biufmM":
+                values = series.to_numpy()
+            else:
+                self.__specs.append(("local", series))
+                continue
+
+            block = SharedMemory(create=True, size=max(values.nbytes, 1))
+            self.__blocks.append(block)
+            buffer = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)
+            buffer[:] = values
+            del buffer
+            self.__specs.append(("shared", block.name, values.dtype.str, tz))
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+    def close(self):
+        """Release the shared memory blocks."""
+
+        for block in self.__blocks:
+            block.close()
+            block.unlink()
+        self.__blocks = []
+
+    def get_chunk(self, start: int, stop: int):
+        """Get rows `start` to `stop` for a worker process.
+
+        :return: Picklable chunk of the frame.
+        :rtype: `_SharedChunk`
+        """
+
+        specs = [
+            ("local", spec[1].iloc[start:stop]) if spec[0] == "local" else spec
+            for spec in self.__specs
+        ]
+
+        return _SharedChunk(
+            columns=self.columns,
+            specs=specs,
+            length=self.length,
+            start=start,
+            stop=stop,
+        )
+
+    def map(self, encode, start: int, stop: int, processes: int):
+        """Encode rows `start` to `stop` in a pool of `processes` workers.
+
+        The rows are split into one slice per worker. Each worker converts its
+        slice to row dictionaries and returns `encode(records)`, which should
+        be a list of payloads ready to send, e.g. BSON bytes, rather than the
+        row dictionaries themselves.
+
+        :param encode: Picklable function from row dictionaries to a list.
+        :type encode: `callable`
+        :return: Concatenated payloads of all slices, in row order.
+        :rtype: `list`
+        """
+
+        from concurrent.futures.process import BrokenProcessPool
+
+        rows = stop - start
+        if rows <= 0:
+            return []
+        size = -(-rows // max(1, min(processes, rows)))
+        chunks = [
+            self.get_chunk(start=begin, stop=min(begin + size, stop))
+            for begin in range(start, stop, size)
+        ]
+
+        pool = get_process_pool(processes=processes)
+        payloads = []
+        try:
+            for payload in pool.map(_encode_chunk, chunks, [encode] * len(chunks)):
+                payloads.extend(payload)
+        except BrokenProcessPool:
+            _discard_process_pool(processes=processes, pool=pool)
+            raise
+
+        return payloads
+
+
+def get_batch_size(
+    data, memory_limit: int, sample_size: int = 1000, prepared: PreparedFrame = None
+):
+    """Get the number of rows of `data` whose payload fits in `memory_limit`.
+
+    The payload size per row is estimated from the row dictionaries of
+    `sample_size` rows spread evenly over the frame and doubled, since
+    drivers build their own parameter copy of every batch they send. It is
+    an average: a batch of rows much longer than the sampled ones can still
+    exceed the limit.
+
+    :param data: Dataframe to write.
+    :type data: `pd.DataFrame`
+    :param memory_limit: Bytes available for one batch.
+    :type memory_limit: `int`
+    :param sample_size: Rows sampled for the estimate, defaults to 1000.
+    :type sample_size: `int`
+    :param prepared: Prepared frame `data` was derived from, defaults to None.
+    :type prepared: `PreparedFrame`, optional
+    :return: Rows per batch, at least 1.
+    :rtype: `int`
+    """
+
+    if data.shape[0] == 0:
+        return 1
+
+    step = max(1, data.shape[0] // sample_size)
+    sample = to_records(data=data.iloc[::step], prepared=prepared)
+
+    sample_bytes = sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+        for row in sample
+    )
+    row_size = 2 * sample_bytes / len(sample)
+
+    return max(1, int(memory_limit // row_size))
@@ -0,0 +1,105 @@
+"""Write a pandas dataframe to several databases concurrently"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from write_df.common import PreparedFrame
+
+__all__ = ["FanOutWriter", "TargetResult"]
+
+TargetResult = namedtuple("TargetResult", ["result", "error", "elapsed"])
+TargetResult.__doc__ = """Outcome of writing to one target
+
+`result` is what the target's write method returned, `error` the exception it
+raised (None on success) and `elapsed` the wall time in seconds.
+"""
+
+
+class FanOutWriter:
+    """Writer sending the same dataframe to several targets at once
+
+    Targets are `SQLDatabaseWriter` or `NoSQLDatabaseWriter` instances added
+    with `add_target`. `write` wraps the dataframe in a `PreparedFrame`, so
+    each column is converted to Python values at most once, when the first
+    target needs it, and writes every target from its own thread. The wall
+    time is that of the slowest target rather than the sum. Writers are not
+    closed by this class.
+
+    :param max_workers: Number of threads, defaults to one per target.
+    :type max_workers: `int`, optional
+    """
+
+    def __init__(self, max_workers: int = None) -> None:
+        self.__max_workers = max_workers
+        self.__targets = {}
+
+    def add_target(self, name: str, writer, **options):
+        """Add target `name` written by `writer`.
+
+        `options` are passed to `writer.write_df_to_db` for SQL writers and to
+        `writer.write_data_to_collection` for NoSQL writers, e.g. `table_name`
+        or `collection_name`.
+
+        :param name: Name identifying the target in the results.
+        :type name: `str`
+        :param writer: Writer of the target database.
+        :type writer: `SQLDatabaseWriter` or `NoSQLDatabaseWriter`
+        """
+
+        assert name not in self.__targets, f"Target `{name}` already added"
+
+        if hasattr(writer, "write_df_to_db"):
+            write = writer.write_df_to_db
+        elif hasattr(writer, "write_data_to_collection"):
+            write = writer.write_data_to_collection
+        else:
+            raise TypeError(f"{type(writer).__name__} is not a supported writer")
+
+        self.__targets[name] = (write, options)
+
+    def get_targets(self):
+        """List names of the targets.
+
+        :return: Target names in the order they were added.
+        :rtype: `list[str]`
+        """
+
+        return list(self.__targets)
+
+    def _write_target(self, name: str, data: PreparedFrame):
+
+        write, options = self.__targets[name]
+        start = time.perf_counter()
+        try:
+            result = write(data=data, **options)
+        except Exception as error:
+            return TargetResult(None, error, time.perf_counter() - start)
+
+        return TargetResult(result, None, time.perf_counter() - start)
+
+    def write(self, data):
+        """Write `data` to every target.
+
+        A failing target does not stop the others; its exception is reported
+        in its result.
+
+        :param data: Dataframe to write.
+        :type data: `pd.DataFrame` or `PreparedFrame`
+        :return: Result per target name.
+        :rtype: `dict[str, TargetResult]`
+        """
+
+        assert self.__targets, "No target added"
+
+        if not isinstance(data, PreparedFrame):
+            data = PreparedFrame(data=data)
+
+        max_workers = self.__max_workers or len(self.__targets)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                name: executor.submit(self._write_target, name, data)
+                for name in self.__targets
+            }
+
+        return {name: future.result() for name, future in futures.items()}
@@ -1,36 +1,105 @@
 """Write a pandas dataframe to a NoSQL database collection"""
 
+from __future__ import annotations
 
-import pandas as pd
-import pymongo
-from write_df.common import nosql_dbtypes
+from typing import TYPE_CHECKING
+
+from write_df.backends import NoSQLBackend, get_backend, list_backends
+from write_df.cache import QueryCache
+from write_df.common import (
+    PreparedFrame,
+    SharedFrame,
+    WriteStats,
+    get_batch_size,
+    to_records,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 __all__ = ["NoSQLDatabaseWriter"]
 
 
+def encode_documents(documents):
+    """Encode row dictionaries `documents` to BSON, adding an `_id` if missing.
+
+    Runs in the worker processes of `write_data_to_collection`, so the parent
+    receives bytes ready to send instead of dictionaries to encode.
+
+    :param documents: Row dictionaries.
+    :type documents: `list[dict]`
+    :return: BSON bytes of the documents, each starting with its `_id`.
+    :rtype: `list[bytes]`
+    """
+
+    from bson import ObjectId, encode
+
+    encoded = []
+    for document in documents:
+        document.setdefault("_id", ObjectId())
+        encoded.append(encode(document))
+
+    return encoded
+
+
+def _get_document_id(raw: bytes):
+
+    from bson import ObjectId
+    from bson.raw_bson import RawBSONDocument
+
+    # `_id` is encoded first: int32 size, type 0x07 (ObjectId), "_id\0", 12 bytes
+    if raw[4:9] == b"\x07_id\x00":
+        return ObjectId(raw[9:21])
+
+    return RawBSONDocument(raw)["_id"]
+
+
 class MongoDatabaseWriter:
     """Writer class for Mongo databases"""
 
     def __init__(
-        self, host: str, dbname: str, user: str, password: str, port: int
+        self,
+        host: str,
+        dbname: str,
+        user: str,
+        password: str,
+        port: int,
+        compressors: str = None,
+        client_options: dict = None,
     ) -> None:
         self.__client = self._get_mongo_client(
             host=host,
             username=user,
             password=password,
             port=port,
+            compressors=compressors,
+            client_options=client_options,
         )
         self.__dbname = dbname
         self.__db = self.__client[dbname]
 
-    def _get_mongo_client(self, host: str, username: str, password: str, port: int):
+    def _get_mongo_client(
+        self,
+        host: str,
+        username: str,
+        password: str,
+        port: int,
+        compressors: str = None,
+        client_options: dict = None,
+    ):
 
         connection_string = (
             f"mongodb+srv://{username}:{password}@{host}/?retryWrites=true&w=majority"
         )
 
+        import pymongo
+
+        options = dict(client_options or {})
+        if compressors:
+            options["compressors"] = compressors
+
         client = pymongo.MongoClient(
-            host=connection_string, port=port, document_class=dict
+            host=connection_string, port=port, document_class=dict, **options
         )
 
         return client
@@ -49,14 +118,61 @@ class MongoDatabaseWriter:
 
         return collection
 
-    def _write_data_to_collection(self, data: pd.DataFrame, collection_name: str):
+    def _write_data_to_collection(
+        self,
+        data: pd.DataFrame,
+        collection_name: str,
+        processes: int = None,
+        memory_limit: int = None,
+        prepared: PreparedFrame = None,
+        max_batch_rows: int = None,
+    ):
 
-        collection = self._get_or_create_collection(collection_name=collection_name)
-        documents = data.to_dict("records")
+        from bson.raw_bson import RawBSONDocument
+        from pymongo.results import InsertManyResult
 
-        res = collection.insert_many(documents=documents)
+        collection = self._get_or_create_collection(collection_name=collection_name)
 
-        return res
+        batch_size = max(1, data.shape[0])
+        if memory_limit is not None:
+            batch_size = get_batch_size(
+                data=data, memory_limit=memory_limit, prepared=prepared
+            )
+        if max_batch_rows:
+            batch_size = min(batch_size, max_batch_rows)
+
+        shared = None
+        if processes and processes > 1 and prepared is None:
+            shared = SharedFrame(data=data)
+
+        inserted_ids = []
+        acknowledged = True
+        try:
+            for start in range(0, data.shape[0], batch_size):
+                stop = min(start + batch_size, data.shape[0])
+                if shared is None:
+                    documents = to_records(
+                        data=data.iloc[start:stop], prepared=prepared
+                    )
+                    res = collection.insert_many(documents=documents)
+                    inserted_ids.extend(res.inserted_ids)
+                else:
+                    encoded = shared.map(
+                        encode=encode_documents,
+                        start=start,
+                        stop=stop,
+                        processes=processes,
+                    )
+                    res = collection.insert_many(
+                        documents=[RawBSONDocument(raw) for raw in encoded]
+                    )
+                    inserted_ids.extend(_get_document_id(raw) for raw in encoded)
+                acknowledged = acknowledged and res.acknowledged
+        finally:
+            if shared is not None:
+                shared.close()
+
+        return InsertManyResult(inserted_ids=inserted_ids, acknowledged=acknowledged)
 
     def _get_document_count(self, collection_name: str):
 
@@ -78,26 +194,88 @@ class MongoDatabaseWriter:
 
 
 class NoSQLDatabaseWriter:
-    """Writer class for NoSQL Database"""
+    """Writer class for NoSQL Database
+
+    `compressors` is a comma separated list of wire compressors to negotiate
+    with the server, e.g. `"zstd,snappy,zlib"`. `client_options` is passed
+    as keyword arguments to the underlying client.
+
+    With `cache_size` set, database and collection listings are kept in a
+    cache of at most `cache_size` bytes for `cache_ttl` seconds. Writes and
+    drops through this writer invalidate them.
+    """
 
     def __init__(
-        self, dbtype: str, host: str, dbname: str, user: str, password: str, port: int
+        self,
+        dbtype: str,
+        host: str,
+        dbname: str,
+        user: str,
+        password: str,
+        port: int,
+        compressors: str = None,
+        client_options: dict = None,
+        cache_size: int = None,
+        cache_ttl: float = None,
     ) -> None:
-        assert dbtype in nosql_dbtypes, f"{dbtype} not in {list(nosql_dbtypes.keys())}"
+        backend = get_backend(dbtype)
+        assert isinstance(
+            backend, NoSQLBackend
+        ), f"{dbtype} not in {list_backends(NoSQLBackend)}"
         self.__dbtype = dbtype
+        self.__backend = backend
+        self.__stats = WriteStats()
+        self.__cache = None
+        if cache_size:
+            self.__cache = QueryCache(max_bytes=cache_size, ttl=cache_ttl)
 
         self.__writer = self._get_writer(
-            host=host, dbname=dbname, user=user, password=password, port=port
+            host=host,
+            dbname=dbname,
+            user=user,
+            password=password,
+            port=port,
+            compressors=compressors,
+            client_options=client_options,
         )
 
-    def _get_writer(self, host: str, dbname: str, user: str, password: str, port: int):
+    def _get_writer(
+        self,
+        host: str,
+        dbname: str,
+        user: str,
+        password: str,
+        port: int,
+        compressors: str = None,
+        client_options: dict = None,
+    ):
 
-        if self.__dbtype == "mongo":
-            return MongoDatabaseWriter(
-                host=host, dbname=dbname, user=user, password=password, port=port
-            )
+        if compressors and "compress" not in self.__backend.capabilities:
+            raise ValueError(f"Compression is not supported for {self.__dbtype}")
+
+        writer_class = self.__backend.get_writer_class()
+
+        return writer_class(
+            host=host,
+            dbname=dbname,
+            user=user,
+            password=password,
+            port=port,
+            compressors=compressors,
+            client_options=client_options,
+        )
+
+    def get_last_write_stats(self):
+        """Get stage timings of the last `write_data_to_collection`.
+
+        Stages are `prepare` and `load` (conversion and sending of the
+        documents). The statement count is not tracked.
+
+        :return: Statistics of the last write.
+        :rtype: `WriteStats`
+        """
 
-        return None
+        return self.__stats
 
     def get_list_of_databases(self):
         """List names of databses in this connection.
@@ -106,7 +284,7 @@ class NoSQLDatabaseWriter:
         :rtype: `list[str]`
         """
 
-        return self.__writer._get_list_of_databases()
+        return self._get_cached("list_databases", self.__writer._get_list_of_databases)
 
     def get_list_of_collections(self):
         """List names of collections in the current database.
@@ -115,7 +293,30 @@ class NoSQLDatabaseWriter:
         :rtype: `list[str]`
         """
 
-        return self.__writer._get_list_of_collections()
+        return self._get_cached(
+            "list_collections", self.__writer._get_list_of_collections
+        )
+
+    def _get_cached(self, key: str, fetch):
+
+        if self.__cache is None:
+            return fetch()
+
+        res = self.__cache.get(key)
+        if res is None:
+            res = fetch()
+            self.__cache.set(key, res, tables=["*"])
+
+        return res
+
+    def _invalidate_cache(self, collection_name: str = None):
+
+        if self.__cache is None:
+            return
+        if collection_name is None:
+            self.__cache.clear()
+        else:
+            self.__cache.invalidate(collection_name)
 
     def get_or_create_collection(self, collection_name: str):
         """Get object for the collection `collection_name`.
@@ -128,20 +329,55 @@ class NoSQLDatabaseWriter:
 
         return self.__writer._get_or_create_collection(collection_name=collection_name)
 
-    def write_data_to_collection(self, collection_name: str, data: pd.DataFrame):
+    def write_data_to_collection(
+        self,
+        collection_name: str,
+        data: pd.DataFrame,
+        processes: int = None,
+        memory_limit: int = None,
+    ):
         """Write dataframe `data` to the collection `collection_name`.
 
         :param collection_name: Name of the collection.
         :type collection_name: `str`
-        :param data: Dataframe to write.
-        :type data: `pd.DataFrame`
+        :param data: Dataframe to write, or a `PreparedFrame` of it whose
+            converted values are reused.
+        :type data: `pd.DataFrame` or `PreparedFrame`
+        :param processes: If set, rows are converted and encoded to BSON in a
+            pool of this many processes, defaults to None. Numeric columns are
+            shared with the workers through shared memory. Ignored for a
+            `PreparedFrame`, whose values are already converted.
+        :type processes: `int`, optional
+        :param memory_limit: If set, documents are inserted in batches sized so
+            that one batch stays within this many bytes, defaults to None.
+        :type memory_limit: `int`, optional
         :return: Object with ids of inserted documents.
         :rtype: `pymongo.results.InsertManyResult`
         """
 
-        return self.__writer._write_data_to_collection(
-            collection_name=collection_name, data=data
-        )
+        stats = WriteStats()
+        self.__stats = stats
+
+        with stats.stage("prepare"):
+            prepared = None
+            if isinstance(data, PreparedFrame):
+                prepared = data
+                data = prepared.data
+
+        try:
+            with stats.stage("load"):
+                res = self.__writer._write_data_to_collection(
+                    collection_name=collection_name,
+                    data=data,
+                    processes=processes,
+                    memory_limit=memory_limit,
+                    prepared=prepared,
+                    max_batch_rows=self.__backend.max_batch_rows,
+                )
+        finally:
+            self._invalidate_cache(collection_name=collection_name)
+
+        return res
 
     def get_document_count(self, collection_name: str):
         """Get number of documents in collection `collection_name`.
@@ -162,11 +398,13 @@ class NoSQLDatabaseWriter:
         """
 
         self.__writer._delete_collection(collection_name=collection_name)
+        self._invalidate_cache(collection_name=collection_name)
 
     def delete_database(self):
         """Drop the current database."""
 
         self.__writer._delete_database()
+        self._invalidate_cache()
 
     def close_connection(self):
         """Close the current connection."""
@@ -0,0 +1,494 @@
+"""Profile writing a sample dataframe to a target table or collection
+
+Run it as a module::
+
+    python -m write_df.profile sample.csv --dbtype postgresql --host localhost \
+        --dbname mydb --user me --password secret --port 5432 --table events
+
+Every write mode is timed on the sample and compared in a table. The modes are
+`row` (one statement per row), `chunked` (batches bounded by `memory_limit`),
+`bulk` (the default single bulk load) and `parallel` (documents encoded in a
+process pool, NoSQL backends only). Without connection parameters, an
+in-memory SQLite database is used as a stand-in. The sample is written to
+`<table>__profile__`, which is dropped at the end, so the target table itself
+is never touched.
+
+An untimed write runs first to warm up the connection and the table. For each
+mode the table shows rows per second of the `load` stage, the wall time of the
+whole write, the peak Python memory of a second, traced write, the
+executes, the kilobytes sent while loading and the time of the `prepare`,
+`schema` and `load` stages. For SQL backends executes are the statements
+SQLAlchemy runs, where one `executemany` counts once although the driver may
+make a round trip per row or per page. For Mongo they are insert commands,
+one round trip each. Modes are ranked on the `load` stage, as every mode
+drops and creates the table the same way. Recommended settings for the table
+follow.
+
+`--compress` (SQL) and `--compressors` (NoSQL) turn on wire compression for
+every mode, so two runs with and without them compare the throughput and
+bytes sent of compressed and uncompressed transport. MySQL reports the bytes
+it received on the session, after compression. For Mongo the insert commands
+are summed as encoded BSON, before compression. Other backends show `-`.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from write_df.backends import NoSQLBackend, get_backend, list_backends
+from write_df.common import to_records
+
+MODES = ("row", "chunked", "bulk", "parallel")
+STAGES = ("prepare", "schema", "load")
+
+
+def _read_sample(path: str, rows: int = None):
+
+    import pandas as pd
+
+    readers = {
+        ".csv": pd.read_csv,
+        ".json": pd.read_json,
+        ".parquet": pd.read_parquet,
+        ".feather": pd.read_feather,
+        ".pkl": pd.read_pickle,
+    }
+    extension = os.path.splitext(path)[1].lower()
+    assert extension in readers, f"{extension} not in {list(readers)}"
+
+    data = readers[extension](path)
+    if rows:
+        data = data.iloc[:rows]
+
+    return data
+
+
+def _get_mode_options(mode: str, memory_limit: int, processes: int):
+
+    if mode == "row":
+        return {"memory_limit": 1}
+    if mode == "chunked":
+        return {"memory_limit": memory_limit}
+    if mode == "parallel":
+        return {"processes": processes}
+
+    return {}
+
+
+def _get_insert_counter():
+
+    import bson
+    from pymongo.monitoring import CommandListener
+
+    class InsertCounter(CommandListener):
+        """Mongo command listener counting insert round trips and their bytes"""
+
+        def __init__(self) -> None:
+            self.count = 0
+            self.bytes = 0
+
+        def started(self, event):
+
+            if event.command_name == "insert":
+                self.count += 1
+                self.bytes += len(bson.encode(event.command))
+
+        def succeeded(self, event):
+            """Ignore finished commands."""
+
+        def failed(self, event):
+            """Ignore failed commands."""
+
+    return InsertCounter()
+
+
+class _Target:
+    """Writer of the profiled table or collection"""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.table_name = f"{args.table}__profile__"
+        self.is_nosql = isinstance(get_backend(args.dbtype), NoSQLBackend)
+        self.counter = None
+
+        if self.is_nosql:
+            from write_df.nosql_writer import NoSQLDatabaseWriter
+
+            self.counter = _get_insert_counter()
+
+            self.writer = NoSQLDatabaseWriter(
+                dbtype=args.dbtype,
+                host=args.host,
+                dbname=args.dbname,
+                user=args.user,
+                password=args.password,
+                port=args.port,
+                compressors=args.compressors,
+                client_options={"event_listeners": [self.counter]},
+            )
+        else:
+            from write_df.sql_writer import SQLDatabaseWriter
+
+            self.writer = SQLDatabaseWriter(
+                dbtype=args.dbtype,
+                host=args.host,
+                dbname=args.dbname,
+                user=args.user,
+                password=args.password,
+                port=args.port,
+                compress=args.compress,
+            )
+
+    def write(self, data, options: dict):
+
+        if self.is_nosql:
+            self.writer.delete_collection(collection_name=self.table_name)
+            inserts = self.counter.count
+            inserted_bytes = self.counter.bytes
+            self.writer.write_data_to_collection(
+                collection_name=self.table_name, data=data, **options
+            )
+            stats = self.writer.get_last_write_stats()
+            stats.statements = self.counter.count - inserts
+            stats.bytes_sent = self.counter.bytes - inserted_bytes
+
+            return stats
+
+        self.writer.write_df_to_db(
+            data=data, table_name=self.table_name, drop_first=True, **options
+        )
+
+        return self.writer.get_last_write_stats()
+
+    def close(self):
+
+        if self.is_nosql:
+            self.writer.delete_collection(collection_name=self.table_name)
+        else:
+            self.writer.delete_table(table_name=self.table_name)
+        self.writer.close_connection()
+
+
+def profile_modes(target: _Target, data, modes, options: dict, memory: bool = True):
+    """Write `data` once per mode and collect the measurements.
+
+    An untimed bulk write runs first, so that connecting and the first table
+    creation are not charged to whichever mode comes first. `rows_per_second`
+    is measured on the `load` stage alone, since every mode drops and creates
+    the table the same way.
+
+    :return: One dictionary per mode with `mode`, `options`, `seconds`,
+        `rows_per_second`, `peak_bytes`, `statements`, `bytes_sent`, `stages`
+        and `error`.
+    :rtype: `list[dict]`
+    """
+
+    try:
+        target.write(data=data, options={})
+    except Exception:
+        # every mode below reports the error itself
+        pass
+
+    results = []
+    for mode in modes:
+        result = {"mode": mode, "options": options[mode], "error": None}
+        try:
+            start = time.perf_counter()
+            stats = target.write(data=data, options=options[mode])
+            seconds = time.perf_counter() - start
+
+            peak_bytes = None
+            if memory:
+                tracemalloc.start()
+                try:
+                    target.write(data=data, options=options[mode])
+                    peak_bytes = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+        except Exception as error:
+            result["error"] = error
+            results.append(result)
+            continue
+
+        load = stats.stages.get("load", seconds)
+        result.update(
+            seconds=seconds,
+            rows_per_second=data.shape[0] / load if load else float("inf"),
+            peak_bytes=peak_bytes,
+            statements=stats.statements,
+            bytes_sent=stats.bytes_sent,
+            stages=dict(stats.stages),
+        )
+        results.append(result)
+
+    return results
+
+
+def _format_number(value, digits: int = 3):
+
+    if value is None:
+        return "-"
+    if isinstance(value, int):
+        return str(value)
+
+    return f"{value:.{digits}f}"
+
+
+def format_results(results):
+    """Format profiling results as a plain text table.
+
+    :return: Table text.
+    :rtype: `str`
+    """
+
+    header = [
+        "mode",
+        "load rows/s",
+        "seconds",
+        "peak MB",
+        "executes",
+        "sent KB",
+        *STAGES,
+    ]
+    rows = [header]
+    for result in results:
+        if result["error"] is not None:
+            error = f"failed: {type(result['error']).__name__}: {result['error']}"
+            rows.append([result["mode"], error])
+            continue
+
+        peak = result["peak_bytes"]
+        sent = result.get("bytes_sent")
+        rows.append(
+            [
+                result["mode"],
+                _format_number(result["rows_per_second"], 1),
+                _format_number(result["seconds"]),
+                _format_number(None if peak is None else peak / 1024**2, 2),
+                _format_number(result["statements"]),
+                _format_number(None if sent is None else sent / 1024, 1),
+                *[_format_number(result["stages"].get(stage)) for stage in STAGES],
+            ]
+        )
+
+    full_rows = [row for row in rows if len(row) == len(header)]
+    widths = [max(len(row[i]) for row in full_rows) for i in range(len(header))]
+    lines = []
+    for row in rows:
+        if len(row) < len(header):
+            lines.append(f"{row[0].ljust(widths[0])}  {row[1]}")
+            continue
+        cells = [row[0].ljust(widths[0])]
+        cells.extend(cell.rjust(width) for cell, width in zip(row[1:], widths[1:]))
+        lines.append("  ".join(cells))
+
+    return "\n".join(lines)
+
+
+def recommend(
+    results,
+    data,
+    convert_seconds: float,
+    zero_copy: bool = False,
+    parallel: bool = False,
+    round_trips: bool = False,
+):
+    """Recommend write settings from profiling results.
+
+    `zero_copy` tells that the backend loads the dataframe without converting
+    it to Python values, so conversion advice does not apply. `parallel`
+    tells that the backend accepts `processes`. `round_trips` tells that
+    `statements` counts round trips to the server, so advice about one round
+    trip per row applies.
+
+    :return: Recommendation lines.
+    :rtype: `list[str]`
+    """
+
+    succeeded = [result for result in results if result["error"] is None]
+    if not succeeded:
+        return ["Every mode failed; check the connection and the table schema."]
+
+    fastest = max(result["rows_per_second"] for result in succeeded)
+    # modes within 10% of the fastest are ties, won by the one with fewer options
+    best = min(
+        (result for result in succeeded if result["rows_per_second"] >= 0.9 * fastest),
+        key=lambda result: (len(result["options"]), -result["rows_per_second"]),
+    )
+    settings = ", ".join(f"{key}={value}" for key, value in best["options"].items())
+    lines = [
+        f"Fastest mode is `{best['mode']}` at {best['rows_per_second']:.1f} rows/s "
+        f"loaded; write with {settings or 'the default settings'}."
+    ]
+
+    stages = best["stages"]
+    if stages.get("schema", 0.0) > 0.5 * best["seconds"]:
+        lines.append(
+            "Schema creation and inspection take most of the time; create the "
+            "table once, write with drop_first=False and send more rows per call."
+        )
+    if not zero_copy and stages.get("load") and convert_seconds > 0.5 * stages["load"]:
+        advice = "simplify object columns"
+        if parallel:
+            advice = "try processes= on a larger sample or simplify object columns"
+        lines.append(f"Converting the dataframe dominates the load; {advice}.")
+    if (
+        round_trips
+        and best["statements"] is not None
+        and best["statements"] >= data.shape[0] > 1
+    ):
+        lines.append(
+            "The server is sent about one command per row; use bulk mode or "
+            "a larger memory_limit."
+        )
+
+    frame_bytes = int(data.memory_usage(deep=True).sum())
+    chunked = [result for result in succeeded if result["mode"] == "chunked"]
+    if (
+        best["mode"] != "chunked"
+        and best["peak_bytes"] is not None
+        and best["peak_bytes"] > 2 * frame_bytes
+        and chunked
+        and chunked[0]["peak_bytes"] is not None
+        and chunked[0]["peak_bytes"] < 0.75 * best["peak_bytes"]
+    ):
+        lines.append(
+            f"`{best['mode']}` peaks at {best['peak_bytes'] / 1024**2:.1f} MB "
+            f"against {chunked[0]['peak_bytes'] / 1024**2:.1f} MB for "
+            f"`chunked`; use memory_limit= where memory is tight."
+        )
+
+    return lines
+
+
+def _get_parser():
+
+    parser = argparse.ArgumentParser(
+        prog="python -m write_df.profile",
+        description="Compare write modes of write_df on a sample dataframe.",
+    )
+    parser.add_argument(
+        "file", help="Sample data file (.csv, .json, .parquet, .feather, .pkl)."
+    )
+    parser.add_argument(
+        "--dbtype",
+        default="sqlite",
+        choices=list_backends(),
+        help="Target database type, defaults to an in-memory SQLite stand-in.",
+    )
+    parser.add_argument("--host")
+    parser.add_argument("--dbname", default=":memory:")
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    parser.add_argument("--port", type=int)
+    parser.add_argument(
+        "--table", default="write_df", help="Name of the table or collection."
+    )
+    parser.add_argument("--rows", type=int, help="Only use the first ROWS rows.")
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=MODES,
+        default=list(MODES),
+        help="Modes to compare, defaults to all.",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=8 * 1024**2,
+        help="Bytes per batch in chunked mode, defaults to 8 MB.",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=min(4, os.cpu_count() or 1),
+        help="Worker processes in parallel mode (NoSQL backends).",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Turn on protocol compression of SQL backends that support it.",
+    )
+    parser.add_argument(
+        "--compressors",
+        help="Wire compressors of NoSQL backends, e.g. zstd,snappy,zlib.",
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Skip the second, traced write per mode that measures peak memory.",
+    )
+
+    return parser
+
+
+def main(argv=None):
+    """Run the profiler with command line arguments `argv`.
+
+    :return: Exit status.
+    :rtype: `int`
+    """
+
+    args = _get_parser().parse_args(argv)
+
+    data = _read_sample(path=args.file, rows=args.rows)
+
+    is_nosql = isinstance(get_backend(args.dbtype), NoSQLBackend)
+    modes = list(args.modes)
+    if "parallel" in modes and not is_nosql:
+        modes.remove("parallel")
+        print("Skipping `parallel`: only NoSQL backends encode in processes.")
+    elif "parallel" in modes and min(args.processes, data.shape[0]) < 2:
+        modes.remove("parallel")
+        print("Skipping `parallel`: it needs at least 2 processes and 2 rows.")
+
+    start = time.perf_counter()
+    to_records(data=data)
+    convert_seconds = time.perf_counter() - start
+
+    options = {
+        mode: _get_mode_options(
+            mode=mode, memory_limit=args.memory_limit, processes=args.processes
+        )
+        for mode in modes
+    }
+
+    target = _Target(args=args)
+    try:
+        results = profile_modes(
+            target=target,
+            data=data,
+            modes=modes,
+            options=options,
+            memory=not args.no_memory,
+        )
+    finally:
+        target.close()
+
+    print(
+        f"Profiled {data.shape[0]} rows x {data.shape[1]} columns on {args.dbtype}; "
+        f"dataframe to Python values takes {convert_seconds:.3f} s."
+    )
+    print()
+    print(format_results(results))
+    print()
+    lines = recommend(
+        results,
+        data=data,
+        convert_seconds=convert_seconds,
+        zero_copy="zero_copy" in get_backend(args.dbtype).capabilities,
+        parallel=is_nosql,
+        round_trips=is_nosql,
+    )
+    for line in lines:
+        print(f"- {line}")
+
+    if all(result["error"] is not None for result in results):
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
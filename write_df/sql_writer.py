@@ -1,21 +1,21 @@
 """Write a pandas dataframe to a SQL database table"""
 
 
+from decimal import Decimal
+
 import pandas as pd
-from pandas.api.types import is_integer_dtype, is_numeric_dtype
-from sqlalchemy import (
-    Column,
-    Float,
-    Integer,
-    MetaData,
-    String,
-    Table,
-    create_engine,
-    text,
+from pandas.api.types import (
+    is_bool_dtype,
+    is_datetime64_any_dtype,
+    is_integer_dtype,
+    is_numeric_dtype,
+    is_object_dtype,
+    is_unsigned_integer_dtype,
 )
-from sqlalchemy.orm import Session
-from sqlalchemy_utils import create_database, database_exists
-from write_df.common import saved_values
+from sqlalchemy import Column, MetaData, Table, create_engine, event, text
+from write_df.backends import SQLBackend, get_backend, list_backends
+from write_df.cache import QueryCache
+from write_df.common import PreparedFrame, WriteStats, get_batch_size
 
 
 class SQLDatabaseWriter:
@@ -25,46 +25,119 @@ class SQLDatabaseWriter:
     Two connections are created: one for the specific database `dbname`
     and another generic connection with no database selected.
     Be sure to call `connobj.close_connection()` after you are done.
+
+    Transport options are passed straight to the driver and the engine:
+    `compress` turns on protocol compression where the driver supports it,
+    `connect_args` is handed to the DBAPI `connect()` call and
+    `engine_options` to `sqlalchemy.create_engine`.
+
+    With `cache_size` set, results of `get_data_from_query` are kept in a
+    least recently used cache of at most `cache_size` bytes for `cache_ttl`
+    seconds. Writes and drops through this writer invalidate the cached
+    queries mentioning the affected table.
     """
 
     def __init__(
         self,
         dbtype: str,
-        host: str,
-        dbname: str,
-        user: str,
-        password: str,
-        port: int,
+        host: str = None,
+        dbname: str = None,
+        user: str = None,
+        password: str = None,
+        port: int = None,
+        compress: bool = False,
+        connect_args: dict = None,
+        engine_options: dict = None,
+        cache_size: int = None,
+        cache_ttl: float = None,
     ):
 
-        assert dbtype in saved_values, f"{dbtype} not in {list(saved_values.keys())}"
+        backend = get_backend(dbtype)
+        assert isinstance(
+            backend, SQLBackend
+        ), f"{dbtype} not in {list_backends(SQLBackend)}"
         assert dbname is not None, "`dbname` must be a valid database name"
         self.__dbtype = dbtype
+        self.__backend = backend
         self.__dbname = dbname
+        self.__stats = WriteStats()
+        self.__statements = 0
+        self.__cache = None
+        if cache_size:
+            self.__cache = QueryCache(max_bytes=cache_size, ttl=cache_ttl)
 
         self.__engine = self._get_db_specific_engine(
             host=host,
             user=user,
             password=password,
             port=port,
+            compress=compress,
+            connect_args=connect_args,
+            engine_options=engine_options,
         )
 
-        if not database_exists(url=self.__engine.url):
-            create_database(self.__engine.url)
+        self.__backend.create_database(engine=self.__engine)
 
-    def _get_db_specific_engine(self, host: str, user: str, password: str, port: int):
+    def _get_connect_args(self, compress: bool, connect_args: dict):
 
-        dialect = saved_values[self.__dbtype]["dialect"]
-        driver = saved_values[self.__dbtype]["driver"]
+        args = {}
+        if compress:
+            if "compress" not in self.__backend.capabilities:
+                raise ValueError(f"Compression is not supported for {self.__dbtype}")
+            args.update(self.__backend.compress_args)
+
+        if connect_args:
+            args.update(connect_args)
+
+        return args
+
+    def _get_db_specific_engine(
+        self,
+        host: str,
+        user: str,
+        password: str,
+        port: int,
+        compress: bool = False,
+        connect_args: dict = None,
+        engine_options: dict = None,
+    ):
 
-        connection_string = (
-            f"{dialect}{driver}://{user}:{password}@{host}:{port}/{self.__dbname}"
+        connection_string = self.__backend.get_url(
+            host=host, dbname=self.__dbname, user=user, password=password, port=port
         )
 
-        engine = create_engine(connection_string, future=True)
+        options = {
+            **self.__backend.get_engine_options(dbname=self.__dbname),
+            **(engine_options or {}),
+        }
+        options["connect_args"] = {
+            **options.get("connect_args", {}),
+            **self._get_connect_args(compress=compress, connect_args=connect_args),
+        }
+
+        engine = create_engine(connection_string, future=True, **options)
+        self.__backend.configure_engine(engine=engine)
+        event.listen(engine, "before_cursor_execute", self._count_statement)
 
         return engine
 
+    def _count_statement(self, *args):
+
+        self.__statements += 1
+
+    def get_last_write_stats(self):
+        """Get stage timings and statement count of the last `write_df_to_db`.
+
+        Stages are `prepare` (dataframe cleanup), `schema` (table creation and
+        inspection) and `load` (conversion and sending of the rows). The
+        statement count is what SQLAlchemy executes, not driver round trips.
+
+        :return: Statistics of the last write.
+        :rtype: `WriteStats`
+        """
+
+        return self.__stats
+
     def get_data_from_query(self, query: str):
         """Execute a single query on the current database.
 
@@ -74,8 +147,23 @@ class SQLDatabaseWriter:
         :rtype: `pd.DataFrame`
         """
 
+        if self.__cache is not None:
+            res = self.__cache.get(query)
+            if res is not None:
+                return res
+
         with self.__engine.connect() as conn:
-            return pd.read_sql(sql=text(query), con=conn)
+            res = pd.read_sql(sql=text(query), con=conn)
+
+        if self.__cache is not None:
+            self.__cache.set(query, res)
+
+        return res
+
+    def _invalidate_cache(self, table_name: str):
+
+        if self.__cache is not None:
+            self.__cache.invalidate(table_name)
 
     def get_list_of_database(self):
         """Get list of databases.
@@ -84,7 +172,7 @@ class SQLDatabaseWriter:
         :rtype: `list[str]`
         """
 
-        query = saved_values[self.__dbtype]["query"]["db_list"]
+        query = self.__backend.get_query("db_list")
 
         res = self.get_data_from_query(query=query)
         database_names = res[res.columns[0]].to_numpy()
@@ -100,22 +188,22 @@ class SQLDatabaseWriter:
         :rtype: `pd.DataFrame`
         """
 
-        sa_session = Session(self.__engine)
+        from sqlalchemy.orm import Session
 
-        query = saved_values[self.__dbtype]["query"]["column_info"].format(
-            self.__dbname, table_name
-        )
-        session = sa_session.execute(query)
-        cursor = session.cursor
-        cols = [detail[0] for detail in cursor.description]
-        res = cursor.fetchall()
-        res = [list(row) for row in res]
+        query = self.__backend.get_query("column_info", self.__dbname, table_name)
+
+        with Session(self.__engine) as sa_session:
+            session = sa_session.execute(text(query))
+            cursor = session.cursor
+            cols = [detail[0] for detail in cursor.description]
+            res = cursor.fetchall()
+            res = [list(row) for row in res]
+
+            session.close()
 
         info = pd.DataFrame(res, columns=cols)
         info.columns = [column.lower() for column in info.columns]
 
-        session.close()
-
         return info
 
     def has_table(self, table_name: str):
@@ -128,14 +216,9 @@ class SQLDatabaseWriter:
         """
 
         with self.__engine.connect() as connection:
-            if "server" in self.__dbtype:
-                return self.__engine.dialect.has_table(
-                    connection=connection, tablename=table_name
-                )
-            else:
-                return self.__engine.dialect.has_table(
-                    connection=connection, table_name=table_name
-                )
+            return self.__backend.has_table(
+                engine=self.__engine, connection=connection, table_name=table_name
+            )
 
     def _check_null(self, data: pd.DataFrame, info: pd.DataFrame, id_col: str):
 
@@ -154,8 +237,8 @@ class SQLDatabaseWriter:
                     raise ValueError(f"`{column}` is non-nullable but has null value")
             columns_valid.append(column)
 
-        data = data[columns_valid].copy()
-        data = data.reset_index(drop=True)
+        if columns_valid != data.columns.tolist():
+            data = data[columns_valid]
 
         return data
 
@@ -165,10 +248,59 @@ class SQLDatabaseWriter:
 
     def _clean_columns(self, data: pd.DataFrame):
 
+        data = data.copy(deep=False)
         data.columns = [self._clean_column(column) for column in data.columns]
 
         return data
 
+    def _get_column_kind(self, column: pd.Series):
+
+        if is_bool_dtype(column):
+            return "boolean"
+        if is_integer_dtype(column):
+            itemsize = column.dtype.itemsize
+            if is_unsigned_integer_dtype(column):
+                # unsigned values need the next wider signed type
+                itemsize *= 2
+            if itemsize > 8:
+                return "unsigned_biginteger"
+            if itemsize > 4:
+                return "biginteger"
+            return "integer"
+        if is_numeric_dtype(column):
+            return "float"
+        if is_datetime64_any_dtype(column):
+            if getattr(column.dtype, "tz", None) is not None:
+                return "datetime_tz"
+            return "datetime"
+        if is_object_dtype(column):
+            values = column.dropna()
+            if values.shape[0] > 0 and isinstance(values.iloc[0], Decimal):
+                return "decimal"
+
+        return "string"
+
+    def _convert_timezones(self, data: pd.DataFrame, prepared: PreparedFrame):
+
+        if "timezone" in self.__backend.capabilities:
+            return data, prepared
+
+        columns = [
+            column
+            for column in data.columns
+            if isinstance(data[column].dtype, pd.DatetimeTZDtype)
+        ]
+        if not columns:
+            return data, prepared
+
+        data = data.copy(deep=False)
+        for column in columns:
+            data[column] = data[column].dt.tz_convert("UTC").dt.tz_localize(None)
+        if prepared is not None:
+            prepared = prepared.replace(data=data, columns=columns)
+
+        return data, prepared
+
     def _get_table_from_dataframe(
         self,
         data: pd.DataFrame,
@@ -181,21 +313,18 @@ class SQLDatabaseWriter:
         columns = []
 
         if id_col:
-            columns.append(Column(id_col, Integer, primary_key=True, nullable=False))
+            columns.append(
+                self.__backend.get_id_column(name=id_col, table_name=table_name)
+            )
 
         for column in data.columns:
             nullable_status = False
             if data[column].dropna().shape[0] < data.shape[0]:
                 nullable_status = True
 
-            if is_integer_dtype(data[column]):
-                columns.append(Column(column, Integer, nullable=nullable_status))
-            elif is_numeric_dtype(data[column]):
-                columns.append(Column(column, Float, nullable=nullable_status))
-            else:
-                columns.append(
-                    Column(column, String(max_length), nullable=nullable_status)
-                )
+            kind = self._get_column_kind(column=data[column])
+            column_type = self.__backend.get_column_type(kind, max_length=max_length)
+            columns.append(Column(column, column_type, nullable=nullable_status))
 
         table = Table(table_name, metadata, *columns)
 
@@ -203,21 +332,49 @@ class SQLDatabaseWriter:
 
     def _create_new_table(self, table: Table):
 
-        table.create(bind=self.__engine, checkfirst=True)
+        if not self.has_table(table_name=table.name):
+            table.create(bind=self.__engine)
 
         return table
 
-    def _write_data_to_table(self, data: pd.DataFrame, table: Table):
-
-        records = data.to_dict("records")
+    def _write_data_to_table(
+        self,
+        data: pd.DataFrame,
+        table: Table,
+        memory_limit: int = None,
+        prepared: PreparedFrame = None,
+    ):
 
         with self.__engine.connect() as conn:
-            ins = table.insert()
-
-            result = conn.execute(ins, records)
+            bytes_sent = self.__backend.get_bytes_sent(connection=conn)
+            if memory_limit is None:
+                result = self.__backend.bulk_load(
+                    connection=conn,
+                    table=table,
+                    data=data,
+                    prepared=prepared,
+                )
+            else:
+                batch_size = get_batch_size(
+                    data=data, memory_limit=memory_limit, prepared=prepared
+                )
+                result = []
+                for start in range(0, data.shape[0], batch_size):
+                    result.append(
+                        self.__backend.bulk_load(
+                            connection=conn,
+                            table=table,
+                            data=data.iloc[start : start + batch_size],
+                            prepared=prepared,
+                        )
+                    )
             conn.commit()
 
-            return result
+            if bytes_sent is not None:
+                bytes_sent = self.__backend.get_bytes_sent(connection=conn) - bytes_sent
+                self.__stats.bytes_sent = bytes_sent
+
+        return result
 
     def delete_table(self, table_name: str):
         """Drop table `table_name` from the current database if it exists.
@@ -226,11 +383,12 @@ class SQLDatabaseWriter:
         :type table: `Table`
         """
 
-        query = f"DROP TABLE IF EXISTS {table_name}"
         with self.__engine.connect() as conn:
-            conn.execute(text(query))
+            self.__backend.drop_table(connection=conn, table_name=table_name)
             conn.commit()
 
+        self._invalidate_cache(table_name=table_name)
+
     def write_df_to_db(
         self,
         data: pd.DataFrame,
@@ -239,11 +397,13 @@ class SQLDatabaseWriter:
         drop_first: bool = False,
         clean_columns: bool = True,
         max_length: int = 100,
+        memory_limit: int = None,
     ):
         """Write `data` to Table `table_name`
 
-        :param data: Pandas dataframe containing data to write.
-        :type data: `pd.DataFrame`
+        :param data: Pandas dataframe containing data to write, or a
+            `PreparedFrame` of it whose converted values are reused.
+        :type data: `pd.DataFrame` or `PreparedFrame`
         :param dbname: Name of the database.
         :type dbname: `str`
         :param table_name: Name of table in the database.
@@ -258,32 +418,61 @@ class SQLDatabaseWriter:
         :type clean_columns: `bool`
         :param max_length: Maximum length of VARCHAR type columns, defaults to 100.
         :type max_length: `int`
-        :return: Cursor with result of query execution.
-        :rtype: `sqlalchemy.engine.cursor.CursorResult`
+        :param memory_limit: If set, rows are sent in batches sized so that the
+            driver payload of one batch stays within this many bytes,
+            defaults to None. All batches are written in one transaction.
+        :type memory_limit: `int`, optional
+        :return: Cursor with result of query execution, or one cursor per batch
+            if `memory_limit` is set.
+        :rtype: `sqlalchemy.engine.cursor.CursorResult` or `list`
         """
 
-        if id_col in data.columns:
-            data = data.drop(id_col, axis=1)
-
-        if clean_columns:
-            data = self._clean_columns(data=data)
-
-        data = data.astype(object).where(pd.notnull(data), None)
+        stats = WriteStats()
+        self.__stats = stats
+        statements = self.__statements
+
+        with stats.stage("prepare"):
+            prepared = None
+            if isinstance(data, PreparedFrame):
+                prepared = data
+                data = prepared.data
+
+            if id_col in data.columns:
+                data = data.drop(id_col, axis=1)
+
+            if clean_columns:
+                data = self._clean_columns(data=data)
+                if prepared is not None:
+                    prepared = prepared.rename(mapper=self._clean_column)
+
+            data, prepared = self._convert_timezones(data=data, prepared=prepared)
+
+        try:
+            with stats.stage("schema"):
+                table = self._get_table_from_dataframe(
+                    data=data,
+                    table_name=table_name,
+                    id_col=id_col,
+                    max_length=max_length,
+                )
 
-        table = self._get_table_from_dataframe(
-            data=data,
-            table_name=table_name,
-            id_col=id_col,
-            max_length=max_length,
-        )
+                if drop_first:
+                    self.delete_table(table_name=table_name)
 
-        if drop_first:
-            self.delete_table(table_name=table_name)
+                table = self._create_new_table(table=table)
+                info = self.get_column_info(table_name=table_name)
+                data = self._check_null(data=data, info=info, id_col=id_col)
 
-        table = self._create_new_table(table=table)
-        info = self.get_column_info(table_name=table_name)
-        data = self._check_null(data=data, info=info, id_col=id_col)
-        result = self._write_data_to_table(data=data, table=table)
+            with stats.stage("load"):
+                result = self._write_data_to_table(
+                    data=data,
+                    table=table,
+                    memory_limit=memory_limit,
+                    prepared=prepared,
+                )
+        finally:
+            stats.statements = self.__statements - statements
+            self._invalidate_cache(table_name=table_name)
 
         return result
 